@@ -5,7 +5,6 @@ from flask_login import LoginManager, current_user
 from datetime import datetime
 import os
 import hashlib
-import uuid
 from werkzeug.utils import secure_filename
 
 # Import your db instance
@@ -20,6 +19,11 @@ from forms.contact_form import ContactForm
 # Import blueprints
 from routes.consultancy_routes import consultancy_bp
 
+# Responsive product image helpers
+from utils.images import rendition_url, rendition_srcset
+from utils.storage import save_upload, release_upload, add_cache_headers
+from utils.delivery import media_url
+
 # Define filter functions
 from datetime import datetime
 
@@ -78,6 +82,7 @@ app = Flask(__name__)
 # Register custom filters
 app.jinja_env.filters['timesince'] = timesince
 app.jinja_env.filters['nl2br'] = nl2br
+app.jinja_env.globals.update(rendition_url=rendition_url, rendition_srcset=rendition_srcset, media_url=media_url)
 
 # =====================================================
 # ⚙️ Configuration
@@ -101,13 +106,30 @@ basedir = os.path.abspath(os.path.dirname(__file__))
 # Ensure database folder exists
 os.makedirs(os.path.join(basedir, 'database'), exist_ok=True)
 
-# Database path
-app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(basedir, 'database', 'agrifarma.db')}"
+# Database path (DATABASE_URL overrides it, e.g. for the test suite)
+app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get(
+    'DATABASE_URL', f"sqlite:///{os.path.join(basedir, 'database', 'agrifarma.db')}")
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 app.config['UPLOAD_FOLDER'] = os.path.join(basedir, 'static', 'uploads', 'avatars')
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 app.config['PRODUCTS_UPLOAD_FOLDER'] = os.path.join(basedir, 'static', 'uploads', 'products')
 os.makedirs(app.config['PRODUCTS_UPLOAD_FOLDER'], exist_ok=True)
+# Worker processes used to build product image renditions
+app.config['IMAGE_WORKERS'] = int(os.environ.get('IMAGE_WORKERS', 2))
+# Whole-request cap: plain multipart forms and each chunk of a chunked upload.
+# Larger blog media goes through the chunked API (/blog/uploads), which
+# enforces UPLOAD_MAX_BYTES per file.
+app.config['MAX_CONTENT_LENGTH'] = int(os.environ.get('MAX_CONTENT_LENGTH', 16 * 1024 * 1024))
+app.config['UPLOAD_MAX_BYTES'] = int(os.environ.get('UPLOAD_MAX_BYTES', 512 * 1024 * 1024))
+app.config['UPLOAD_CHUNK_BYTES'] = int(os.environ.get('UPLOAD_CHUNK_BYTES', 4 * 1024 * 1024))
+# Partial chunked uploads are staged outside static/ so they are never served
+app.config['UPLOAD_INCOMING_FOLDER'] = os.environ.get('UPLOAD_INCOMING_FOLDER',
+                                                      os.path.join(app.instance_path, 'uploads'))
+# /media serving (utils/delivery.py): cache lifetime for non-store uploads, and
+# MEDIA_OFFLOAD=x-accel|x-sendfile to let nginx/Apache stream the bytes
+app.config['MEDIA_MAX_AGE'] = int(os.environ.get('MEDIA_MAX_AGE', 24 * 3600))
+app.config['MEDIA_OFFLOAD'] = os.environ.get('MEDIA_OFFLOAD', '')
+app.config['MEDIA_ACCEL_PREFIX'] = os.environ.get('MEDIA_ACCEL_PREFIX', '/_media/')
 # Stories feature removed: STORIES_UPLOAD_FOLDER not needed
 
 # Initialize extensions
@@ -125,6 +147,26 @@ except Exception as e:
 # Now initialize migrations (models are imported above)
 migrate = Migrate(app, db)
 
+# =====================================================
+# 🧰 CLI Commands
+# =====================================================
+# Importing utils.search also registers the ORM listeners that keep the
+# product and blog post full-text indexes in sync.
+from utils.search import search_cli, create_product_index, create_post_index
+from utils.cli import products_cli, blog_cli
+from utils.media import media_cli
+import utils.related  # registers related-products refresh listeners
+import utils.expiry  # sets expires_at on new listings
+import utils.facets  # keeps marketplace facet counts in sync
+import utils.blog_covers  # keeps post.cover_media_path in sync
+import utils.blog_counters  # keeps post like/comment counters in sync
+import utils.blog_tags  # keeps post_tags in sync with post.tags
+from utils.cart import cached_cart_count
+app.cli.add_command(search_cli)
+app.cli.add_command(products_cli)
+app.cli.add_command(media_cli)
+app.cli.add_command(blog_cli)
+
 # =====================================================
 # 🕒 Custom Jinja Filter (strftime)
 # =====================================================
@@ -147,6 +189,7 @@ try:
     from routes.admin_routes import admin_bp
     from routes.consultancy_routes import consultancy_bp
     from routes.contact_routes import contact_bp
+    from routes.media_routes import media_bp
 
     # Register blueprints
     app.register_blueprint(auth_bp, url_prefix='/auth')
@@ -156,6 +199,7 @@ try:
     app.register_blueprint(admin_bp, url_prefix='/admin')
     app.register_blueprint(consultancy_bp, url_prefix='/consultancy')
     app.register_blueprint(contact_bp)
+    app.register_blueprint(media_bp, url_prefix='/media')
 except ImportError as e:
     print(f"⚠️ Blueprint import error: {e}")
 
@@ -182,18 +226,9 @@ def consultancy():
 
 @app.route('/shop')
 def shop():
-    from models.product import Product
-    from models.category import Category
-    # Get all active products for the marketplace
-    products = Product.query.filter_by(active=True).order_by(Product.created_at.desc()).all()
-    categories = Category.query.all()
-    return render_template('ecommerce/product_list.html',
-                         products=products,
-                         pagination=None,
-                         q='',
-                         sort='newest',
-                         per_page=12,
-                         is_admin=(session.get('user_role')=='admin'))
+    # Same paginated listing as /shop/ (first page, newest first)
+    from routes.ecommerce_routes import product_list
+    return product_list()
 
 
 @app.route('/stories/')
@@ -244,20 +279,10 @@ def edit_profile():
                 filename = secure_filename(file.filename)
                 ext = os.path.splitext(filename)[1].lower()
                 if ext in ['.jpg','.jpeg','.png','.gif','.webp']:
-                    # Remove old picture if exists
-                    if user.picture:
-                        try:
-                            old_path = os.path.join('static', user.picture)
-                            if os.path.exists(old_path):
-                                os.remove(old_path)
-                        except Exception as e:
-                            print(f"Warning: Could not delete old picture: {e}")
-                    
-                    # Save new picture
-                    unique = f"{uuid.uuid4().hex}{ext}"
-                    save_path = os.path.join(app.config['UPLOAD_FOLDER'], unique)
-                    file.save(save_path)
-                    user.picture = f"uploads/avatars/{unique}"
+                    # Save new picture and drop our reference to the old one
+                    old_picture = user.picture
+                    user.picture = save_upload(file, ext)
+                    release_upload(old_picture)
             
             db.session.commit()
             
@@ -290,12 +315,11 @@ def register():
 # =====================================================
 @app.context_processor
 def inject_cart_data():
-    def get_cart_data():
-        cart = session.get('cart', {})
-        total_items = sum(cart.values()) if cart else 0
-        return {'cart_count': total_items, 'cart': cart}
-    
-    return get_cart_data()
+    # Badge count is cached in the session by CartService; no DB query here
+    return {'cart_count': cached_cart_count()}
+
+# Long-lived caching for content-addressed uploads
+app.after_request(add_cache_headers)
 
 # =====================================================
 # 🧠 Database Setup (development convenience)
@@ -305,6 +329,9 @@ if __name__ == '__main__':
     with app.app_context():
         try:
             db.create_all()
+            with db.engine.begin() as conn:
+                create_product_index(conn)
+                create_post_index(conn)
             
             # Create admin user if it doesn't exist
             from models.user import User
@@ -0,0 +1,72 @@
+"""
+Shared pytest fixtures.
+
+The suite runs against a throwaway SQLite database, static folder and
+upload staging folder, so it never touches database/agrifarma.db,
+static/uploads or instance/. DATABASE_URL has to be set before app.py is
+imported, which is why it happens at the top of this module.
+"""
+import os
+import shutil
+import tempfile
+
+import pytest
+
+_tmp = tempfile.mkdtemp(prefix='agrifarma-tests-')
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(_tmp, 'test.db')}"
+
+from app import app as flask_app  # noqa: E402
+from db import db  # noqa: E402
+import models  # noqa: E402,F401  (register every table with the metadata)
+from utils.blog_tags import invalidate_tag_cloud  # noqa: E402
+from utils.search import POST_FTS_TABLE, PRODUCT_FTS_TABLE, create_post_index, create_product_index  # noqa: E402
+
+flask_app.config.update(
+    TESTING=True,
+    WTF_CSRF_ENABLED=False,
+    # Tests call refresh_related() themselves instead of on every commit
+    RELATED_PRODUCTS_AUTO_REFRESH=False,
+)
+
+# test_messaging.py is a standalone check (`python test_messaging.py`): it
+# runs at import time and exits the process on failure, so pytest must not
+# import it.
+collect_ignore = ['test_messaging.py']
+
+
+def _reset_schema():
+    with db.engine.begin() as conn:
+        conn.exec_driver_sql(f'DROP TABLE IF EXISTS {PRODUCT_FTS_TABLE}')
+        conn.exec_driver_sql(f'DROP TABLE IF EXISTS {POST_FTS_TABLE}')
+    db.drop_all()
+    db.create_all()
+    with db.engine.begin() as conn:
+        create_product_index(conn)
+        create_post_index(conn)
+
+
+@pytest.fixture
+def app(tmp_path):
+    """The app with an empty database and private static/incoming folders."""
+    static = tmp_path / 'static'
+    static.mkdir()
+    original_static = flask_app.static_folder
+    original_incoming = flask_app.config['UPLOAD_INCOMING_FOLDER']
+    flask_app.static_folder = str(static)
+    flask_app.config['UPLOAD_INCOMING_FOLDER'] = str(tmp_path / 'incoming')
+    with flask_app.app_context():
+        _reset_schema()
+        invalidate_tag_cloud()
+        yield flask_app
+        db.session.remove()
+    flask_app.static_folder = original_static
+    flask_app.config['UPLOAD_INCOMING_FOLDER'] = original_incoming
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+def pytest_sessionfinish(session, exitstatus):
+    shutil.rmtree(_tmp, ignore_errors=True)
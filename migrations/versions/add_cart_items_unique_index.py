@@ -0,0 +1,41 @@
+"""Make cart_items (user_id, product_id) unique
+
+Revision ID: cart_items_unique_001
+Revises: add_product_related_001
+Create Date: 2026-10-18 12:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'cart_items_unique_001'
+down_revision = 'add_product_related_001'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Fold duplicate rows left by the old read-then-write add-to-cart into
+    # the oldest row before the unique index can be created
+    op.execute(
+        "UPDATE cart_items SET quantity = ("
+        "  SELECT SUM(dup.quantity) FROM cart_items AS dup"
+        "  WHERE dup.user_id = cart_items.user_id AND dup.product_id = cart_items.product_id"
+        ") WHERE id IN ("
+        "  SELECT MIN(id) FROM cart_items GROUP BY user_id, product_id HAVING COUNT(*) > 1"
+        ")"
+    )
+    op.execute(
+        "DELETE FROM cart_items WHERE id NOT IN ("
+        "  SELECT MIN(id) FROM cart_items GROUP BY user_id, product_id"
+        ")"
+    )
+    op.drop_index('ix_cart_items_user_product', table_name='cart_items')
+    op.create_index('uq_cart_items_user_product', 'cart_items', ['user_id', 'product_id'], unique=True)
+
+
+def downgrade():
+    op.drop_index('uq_cart_items_user_product', table_name='cart_items')
+    op.create_index('ix_cart_items_user_product', 'cart_items', ['user_id', 'product_id'], unique=False)
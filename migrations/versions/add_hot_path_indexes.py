@@ -0,0 +1,49 @@
+"""Add indexes for hot filter/sort query paths
+
+Revision ID: add_hot_path_indexes_001
+Revises: add_product_fts_001
+Create Date: 2026-10-18 10:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_hot_path_indexes_001'
+down_revision = 'add_product_fts_001'
+branch_labels = None
+depends_on = None
+
+
+# (index name, table, columns) - kept in sync with the model declarations
+INDEXES = [
+    ('ix_product_active_created_at', 'product', ['active', 'created_at']),
+    ('ix_product_active_price', 'product', ['active', 'price']),
+    ('ix_product_seller_created_at', 'product', ['seller_id', 'created_at']),
+    ('ix_product_category_subcategory', 'product', ['category_id', 'subcategory_id']),
+    ('ix_product_expires_at', 'product', ['expires_at']),
+    ('ix_subcategory_category_id', 'subcategory', ['category_id']),
+    ('ix_thread_category_created_at', 'thread', ['category_id', 'created_at']),
+    ('ix_thread_created_at', 'thread', ['created_at']),
+    ('ix_reply_thread_created_at', 'reply', ['thread_id', 'created_at']),
+    ('ix_post_created_at', 'post', ['created_at']),
+    ('ix_post_category_created_at', 'post', ['category_id', 'created_at']),
+    ('ix_blog_comment_post_created_at', 'blog_comment', ['post_id', 'created_at']),
+    ('ix_blog_media_post_id', 'blog_media', ['post_id']),
+    ('ix_comment_reply_comment_id', 'comment_reply', ['comment_id']),
+    ('ix_like_post_user', 'like', ['post_id', 'user_id']),
+    ('ix_cart_items_user_product', 'cart_items', ['user_id', 'product_id']),
+    ('ix_consultant_status', 'consultant', ['status']),
+    ('ix_messages_status_created_at', 'messages', ['status', 'created_at']),
+]
+
+
+def upgrade():
+    for name, table, columns in INDEXES:
+        op.create_index(name, table, columns, unique=False)
+
+
+def downgrade():
+    for name, table, columns in reversed(INDEXES):
+        op.drop_index(name, table_name=table)
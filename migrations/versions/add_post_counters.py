@@ -0,0 +1,33 @@
+"""Add like_count and comment_count to post
+
+Revision ID: add_post_counters_001
+Revises: add_post_cover_001
+Create Date: 2026-10-18 18:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_post_counters_001'
+down_revision = 'add_post_cover_001'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('post', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('like_count', sa.Integer(), nullable=False, server_default='0'))
+        batch_op.add_column(sa.Column('comment_count', sa.Integer(), nullable=False, server_default='0'))
+    op.execute(
+        'UPDATE post SET'
+        ' like_count = (SELECT count(*) FROM "like" WHERE "like".post_id = post.id AND "like".comment_id IS NULL),'
+        ' comment_count = (SELECT count(*) FROM blog_comment WHERE blog_comment.post_id = post.id)'
+    )
+
+
+def downgrade():
+    with op.batch_alter_table('post', schema=None) as batch_op:
+        batch_op.drop_column('comment_count')
+        batch_op.drop_column('like_count')
@@ -0,0 +1,32 @@
+"""Add denormalised cover_media_path to post
+
+Revision ID: add_post_cover_001
+Revises: add_updated_at_001
+Create Date: 2026-10-18 17:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_post_cover_001'
+down_revision = 'add_updated_at_001'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('post', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('cover_media_path', sa.String(length=255), nullable=True))
+    op.execute(
+        "UPDATE post SET cover_media_path = ("
+        " SELECT file_path FROM blog_media"
+        " WHERE blog_media.post_id = post.id AND blog_media.media_type = 'image'"
+        " ORDER BY blog_media.id LIMIT 1)"
+    )
+
+
+def downgrade():
+    with op.batch_alter_table('post', schema=None) as batch_op:
+        batch_op.drop_column('cover_media_path')
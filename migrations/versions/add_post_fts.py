@@ -0,0 +1,36 @@
+"""Add FTS5 full-text index for blog posts
+
+Revision ID: add_post_fts_001
+Revises: add_post_tags_index_001
+Create Date: 2026-10-18 20:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_post_fts_001'
+down_revision = 'add_post_tags_index_001'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # FTS5 virtual tables are SQLite-only; other backends keep ILIKE search
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    op.execute(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS post_fts "
+        "USING fts5(title, body, tags, tokenize='unicode61 remove_diacritics 2')"
+    )
+    op.execute(
+        "INSERT INTO post_fts(rowid, title, body, tags) "
+        "SELECT id, title, coalesce(body, ''), coalesce(tags, '') FROM post"
+    )
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    op.execute("DROP TABLE IF EXISTS post_fts")
@@ -0,0 +1,24 @@
+"""Index post_tags by tag for the blog tag filter
+
+Revision ID: add_post_tags_index_001
+Revises: add_post_counters_001
+Create Date: 2026-10-18 19:00:00
+
+Run `flask blog backfill-tags` afterwards to index existing posts.
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_post_tags_index_001'
+down_revision = 'add_post_counters_001'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_post_tags_tag_id_post_id', 'post_tags', ['tag_id', 'post_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_post_tags_tag_id_post_id', table_name='post_tags')
@@ -0,0 +1,45 @@
+"""Add product_facet summary table for marketplace filters
+
+Revision ID: add_product_facet_001
+Revises: add_stored_file_001
+Create Date: 2026-10-18 15:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_product_facet_001'
+down_revision = 'add_stored_file_001'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('product_facet',
+    sa.Column('category_id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('subcategory_id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('price_bucket', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('count', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('category_id', 'subcategory_id', 'price_bucket')
+    )
+    # Seed the counts; buckets match utils.facets.PRICE_BUCKETS at the time of
+    # writing. `flask products rebuild-facets` recomputes them at any time.
+    op.execute("""
+        INSERT INTO product_facet (category_id, subcategory_id, price_bucket, count)
+        SELECT coalesce(category_id, 0), coalesce(subcategory_id, 0),
+               CASE WHEN coalesce(price, 0) < 25 THEN 0
+                    WHEN coalesce(price, 0) < 50 THEN 1
+                    WHEN coalesce(price, 0) < 100 THEN 2
+                    WHEN coalesce(price, 0) < 500 THEN 3
+                    ELSE 4 END AS bucket,
+               count(*)
+        FROM product
+        WHERE active = 1
+        GROUP BY 1, 2, 3
+    """)
+
+
+def downgrade():
+    op.drop_table('product_facet')
@@ -0,0 +1,36 @@
+"""Add FTS5 full-text index for products
+
+Revision ID: add_product_fts_001
+Revises: cart_items_table, remove_subcategory_consultant
+Create Date: 2026-10-18 09:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_product_fts_001'
+down_revision = ('cart_items_table', 'remove_subcategory_consultant')
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # FTS5 virtual tables are SQLite-only; other backends keep ILIKE search
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    op.execute(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS product_fts "
+        "USING fts5(title, description, specifications, tokenize='unicode61 remove_diacritics 2')"
+    )
+    op.execute(
+        "INSERT INTO product_fts(rowid, title, description, specifications) "
+        "SELECT id, title, coalesce(description, ''), coalesce(specifications, '') FROM product"
+    )
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    op.execute("DROP TABLE IF EXISTS product_fts")
@@ -0,0 +1,36 @@
+"""Add product_related table for precomputed related products
+
+Revision ID: add_product_related_001
+Revises: add_hot_path_indexes_001
+Create Date: 2026-10-18 11:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_product_related_001'
+down_revision = 'add_hot_path_indexes_001'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Populate afterwards with: flask products rebuild-related
+    op.create_table('product_related',
+    sa.Column('product_id', sa.Integer(), nullable=False),
+    sa.Column('rank', sa.Integer(), nullable=False),
+    sa.Column('related_id', sa.Integer(), nullable=False),
+    sa.Column('score', sa.Float(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['product_id'], ['product.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['related_id'], ['product.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('product_id', 'rank')
+    )
+    op.create_index('ix_product_related_related_id', 'product_related', ['related_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_product_related_related_id', table_name='product_related')
+    op.drop_table('product_related')
@@ -0,0 +1,35 @@
+"""Add stored_file table for content-addressed uploads
+
+Revision ID: add_stored_file_001
+Revises: cart_items_unique_001
+Create Date: 2026-10-18 14:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_stored_file_001'
+down_revision = 'cart_items_unique_001'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Existing uuid-named uploads are left where they are and stay untracked
+    op.create_table('stored_file',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('sha256', sa.String(length=64), nullable=False),
+    sa.Column('path', sa.String(length=255), nullable=False),
+    sa.Column('size', sa.Integer(), nullable=False),
+    sa.Column('refcount', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('path'),
+    sa.UniqueConstraint('sha256')
+    )
+
+
+def downgrade():
+    op.drop_table('stored_file')
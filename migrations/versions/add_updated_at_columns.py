@@ -0,0 +1,32 @@
+"""Add updated_at to product, post and thread
+
+Revision ID: add_updated_at_001
+Revises: add_product_facet_001
+Create Date: 2026-10-18 16:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_updated_at_001'
+down_revision = 'add_product_facet_001'
+branch_labels = None
+depends_on = None
+
+TABLES = ('product', 'post', 'thread')
+
+
+def upgrade():
+    for table in TABLES:
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.add_column(sa.Column('updated_at', sa.DateTime(), nullable=True))
+        # Existing rows were last modified no earlier than they were created
+        op.execute(f"UPDATE {table} SET updated_at = created_at")
+
+
+def downgrade():
+    for table in TABLES:
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.drop_column('updated_at')
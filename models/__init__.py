@@ -11,3 +11,7 @@ from .like import Like
 from .tag import Tag
 from .message import Message
 from .cart_item import CartItem
+from .product_related import ProductRelated
+from .stored_file import StoredFile
+from .product_facet import ProductFacet
+from .upload_session import UploadSession
@@ -4,6 +4,9 @@ from datetime import datetime
 
 class BlogComment(db.Model):
     __tablename__ = 'blog_comment'
+    __table_args__ = (
+        db.Index('ix_blog_comment_post_created_at', 'post_id', 'created_at'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     post_id = db.Column(db.Integer, db.ForeignKey('post.id'), nullable=False)
     author_id = db.Column(db.Integer, db.ForeignKey('user.id'))
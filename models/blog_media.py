@@ -5,7 +5,7 @@ from datetime import datetime
 class BlogMedia(db.Model):
     __tablename__ = 'blog_media'
     id = db.Column(db.Integer, primary_key=True)
-    post_id = db.Column(db.Integer, db.ForeignKey('post.id'), nullable=False)
+    post_id = db.Column(db.Integer, db.ForeignKey('post.id'), nullable=False, index=True)
     file_path = db.Column(db.String(255), nullable=False)
     media_type = db.Column(db.String(50))  # image, video, audio, pdf, doc, ppt, other
     uploaded_at = db.Column(db.DateTime, default=datetime.utcnow)
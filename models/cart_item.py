@@ -3,6 +3,10 @@ from datetime import datetime
 
 class CartItem(db.Model):
     __tablename__ = 'cart_items'
+    __table_args__ = (
+        # One row per (user, product); add-to-cart upserts against this
+        db.Index('uq_cart_items_user_product', 'user_id', 'product_id', unique=True),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
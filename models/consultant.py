@@ -13,7 +13,7 @@ class Consultant(db.Model):
     expertise_category = db.Column(db.Integer, db.ForeignKey('category.id'), nullable=False)
     bio = db.Column(db.Text, nullable=False)
     profile_picture = db.Column(db.String(255))
-    status = db.Column(db.Enum('pending', 'approved', 'rejected', name='consultant_status'), default='pending')
+    status = db.Column(db.Enum('pending', 'approved', 'rejected', name='consultant_status'), default='pending', index=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
@@ -13,10 +13,15 @@ class ForumCategory(db.Model):
 
 
 class Thread(db.Model):
+    __table_args__ = (
+        db.Index('ix_thread_category_created_at', 'category_id', 'created_at'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(200), nullable=False)
     body = db.Column(db.Text, nullable=False)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     author_id = db.Column(db.Integer, db.ForeignKey('user.id'))
     category_id = db.Column(db.Integer, db.ForeignKey('forum_category.id'), nullable=False)
     category = db.relationship('ForumCategory', backref='threads')
@@ -27,6 +32,10 @@ class Thread(db.Model):
 
 
 class Reply(db.Model):
+    __table_args__ = (
+        db.Index('ix_reply_thread_created_at', 'thread_id', 'created_at'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     body = db.Column(db.Text, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -4,6 +4,9 @@ from datetime import datetime
 
 class Like(db.Model):
     __tablename__ = 'like'
+    __table_args__ = (
+        db.Index('ix_like_post_user', 'post_id', 'user_id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
     post_id = db.Column(db.Integer, db.ForeignKey('post.id'), nullable=True)
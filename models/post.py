@@ -2,15 +2,25 @@ from db import db
 from datetime import datetime
 
 class Post(db.Model):
+    __table_args__ = (
+        db.Index('ix_post_category_created_at', 'category_id', 'created_at'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(200), nullable=False)
     body = db.Column(db.Text, nullable=False)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     author_id = db.Column(db.Integer, db.ForeignKey('user.id'))
     category = db.Column(db.String(100))
     category_id = db.Column(db.Integer)
     subcategory_id = db.Column(db.Integer)
     tags = db.Column(db.String(250))
+    # file_path of the first image in media, kept by utils.blog_covers
+    cover_media_path = db.Column(db.String(255))
+    # Kept by utils.blog_counters; `flask blog reconcile-counters` repairs them
+    like_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    comment_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
 
     # Relationships (not adding new columns here to avoid immediate DB change)
     media = db.relationship('BlogMedia', backref='post', cascade='all, delete-orphan')
@@ -5,13 +5,23 @@ from sqlalchemy.sql import func
 # Categories will be in separate model file
 
 class Product(db.Model):
+    __table_args__ = (
+        # Marketplace listing: active products newest-first / by price
+        db.Index('ix_product_active_created_at', 'active', 'created_at'),
+        db.Index('ix_product_active_price', 'active', 'price'),
+        # Seller dashboard: a seller's products newest-first
+        db.Index('ix_product_seller_created_at', 'seller_id', 'created_at'),
+        db.Index('ix_product_category_subcategory', 'category_id', 'subcategory_id'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(200), nullable=False)
     description = db.Column(db.Text)
     price = db.Column(db.Float, default=0.0)
     active = db.Column(db.Boolean, default=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    expires_at = db.Column(db.DateTime, nullable=True)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    expires_at = db.Column(db.DateTime, nullable=True, index=True)
     seller_id = db.Column(db.Integer, db.ForeignKey('user.id'))
     seller_email = db.Column(db.String(200))
     specifications = db.Column(db.Text)
@@ -0,0 +1,18 @@
+from db import db
+
+
+class ProductFacet(db.Model):
+    """Active-product count per (category, subcategory, price bucket).
+
+    Maintained incrementally by utils.facets so the marketplace filters can
+    show counts without grouping the product table on every request.
+    0 stands for "no category" / "no subcategory".
+    """
+    __tablename__ = 'product_facet'
+    category_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    subcategory_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    price_bucket = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<ProductFacet {self.category_id}/{self.subcategory_id}/{self.price_bucket}: {self.count}>'
@@ -0,0 +1,19 @@
+from db import db
+from datetime import datetime
+
+
+class ProductRelated(db.Model):
+    """Precomputed top-k neighbours of a product, ordered by rank.
+
+    Built by utils.related; read by ecommerce.product_detail with a single
+    primary-key range lookup.
+    """
+    __tablename__ = 'product_related'
+    product_id = db.Column(db.Integer, db.ForeignKey('product.id', ondelete='CASCADE'), primary_key=True)
+    rank = db.Column(db.Integer, primary_key=True)
+    related_id = db.Column(db.Integer, db.ForeignKey('product.id', ondelete='CASCADE'), nullable=False, index=True)
+    score = db.Column(db.Float, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<ProductRelated {self.product_id} #{self.rank}: {self.related_id}>'
@@ -0,0 +1,20 @@
+from db import db
+from datetime import datetime
+
+
+class StoredFile(db.Model):
+    """One content-addressed upload under static/uploads/store.
+
+    Files are named after the SHA-256 of their bytes, so identical uploads
+    share a single file; refcount tracks how many rows point at it.
+    """
+    __tablename__ = 'stored_file'
+    id = db.Column(db.Integer, primary_key=True)
+    sha256 = db.Column(db.String(64), nullable=False, unique=True)
+    path = db.Column(db.String(255), nullable=False, unique=True)
+    size = db.Column(db.Integer, nullable=False)
+    refcount = db.Column(db.Integer, nullable=False, default=1)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<StoredFile {self.path} x{self.refcount}>'
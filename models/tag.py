@@ -4,7 +4,9 @@ from db import db
 post_tags = db.Table(
     'post_tags',
     db.Column('post_id', db.Integer, db.ForeignKey('post.id'), primary_key=True),
-    db.Column('tag_id', db.Integer, db.ForeignKey('tag.id'), primary_key=True)
+    db.Column('tag_id', db.Integer, db.ForeignKey('tag.id'), primary_key=True),
+    # Tag filter on the blog list: tag -> posts
+    db.Index('ix_post_tags_tag_id_post_id', 'tag_id', 'post_id'),
 )
 
 
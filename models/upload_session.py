@@ -0,0 +1,22 @@
+from db import db
+from datetime import datetime
+
+
+class UploadSession(db.Model):
+    """A resumable chunked upload in progress (utils.uploads).
+
+    Bytes 0..received of the file are on disk in the session's .part file;
+    the client resumes by asking for `received` and appending from there.
+    """
+    __tablename__ = 'upload_session'
+    id = db.Column(db.String(32), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    filename = db.Column(db.String(255), nullable=False)
+    ext = db.Column(db.String(10), nullable=False)
+    size = db.Column(db.BigInteger, nullable=False)
+    received = db.Column(db.BigInteger, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
+
+    def __repr__(self):
+        return f'<UploadSession {self.id} {self.received}/{self.size}>'
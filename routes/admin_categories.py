@@ -1,6 +1,7 @@
 from flask import render_template, request, redirect, url_for, flash
 from db import db
 from utils import admin_required
+from utils.taxonomy import invalidate_taxonomy
 
 def init_category_routes(admin_bp):
     @admin_bp.route('/categories')
@@ -28,6 +29,7 @@ def init_category_routes(admin_bp):
         category = Category(name=name, description=description)
         db.session.add(category)
         db.session.commit()
+        invalidate_taxonomy()
         flash('Category added successfully', 'success')
         return redirect(url_for('admin.manage_categories'))
 
@@ -51,6 +53,7 @@ def init_category_routes(admin_bp):
         category.name = name
         category.description = description
         db.session.commit()
+        invalidate_taxonomy()
         flash('Category updated successfully', 'success')
         return redirect(url_for('admin.manage_categories'))
 
@@ -63,6 +66,7 @@ def init_category_routes(admin_bp):
         try:
             db.session.delete(category)
             db.session.commit()
+            invalidate_taxonomy()
             flash('Category deleted successfully', 'success')
         except Exception as e:
             db.session.rollback()
@@ -89,6 +93,7 @@ def init_category_routes(admin_bp):
         subcategory = SubCategory(name=name, description=description, category_id=category_id)
         db.session.add(subcategory)
         db.session.commit()
+        invalidate_taxonomy()
         flash('Subcategory added successfully', 'success')
         return redirect(url_for('admin.manage_categories'))
 
@@ -112,6 +117,7 @@ def init_category_routes(admin_bp):
         subcategory.name = name
         subcategory.description = description
         db.session.commit()
+        invalidate_taxonomy()
         flash('Subcategory updated successfully', 'success')
         return redirect(url_for('admin.manage_categories'))
 
@@ -124,6 +130,7 @@ def init_category_routes(admin_bp):
         try:
             db.session.delete(subcategory)
             db.session.commit()
+            invalidate_taxonomy()
             flash('Subcategory deleted successfully', 'success')
         except Exception as e:
             db.session.rollback()
@@ -1,14 +1,21 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, session, current_app
+from flask import Blueprint, render_template, request, redirect, url_for, flash, session
 from db import db
 from models.user import User
 import os
-import uuid
+from datetime import datetime
+from sqlalchemy import func
 from werkzeug.utils import secure_filename
 from models.post import Post
 from models.product import Product
 from models.consultant import Consultant
 from models.forum import ForumCategory, Thread
 from utils import admin_required
+from utils.search import search_products
+from utils.pagination import keyset_paginate, clamp_per_page
+from utils.images import generate_renditions
+from utils.storage import save_upload, release_upload
+from utils.expiry import expire_products
+from utils.taxonomy import category_choices, subcategory_choices
 from routes.admin_forum_routes import init_forum_admin_routes
 from routes.admin_categories import init_category_routes
 
@@ -35,8 +42,8 @@ def manage_users():
     q = request.args.get('q', '', type=str).strip()
     role = request.args.get('role', '', type=str).strip()
     sort = request.args.get('sort', 'newest', type=str)
-    page = request.args.get('page', 1, type=int)
-    per_page = request.args.get('per_page', 10, type=int)
+    cursor = request.args.get('cursor', type=str)
+    per_page = clamp_per_page(request.args.get('per_page', 10, type=int), default=10)
 
     query = User.query
     if q:
@@ -45,16 +52,18 @@ def manage_users():
     if role:
         query = query.filter(User.role == role)
 
+    # join_date is nullable; keyset keys must never be NULL
+    joined = func.coalesce(User.join_date, datetime(1970, 1, 1))
     if sort == 'name_asc':
-        query = query.order_by(User.name.asc())
+        order = [(User.name, 'asc'), (User.id, 'asc')]
     elif sort == 'name_desc':
-        query = query.order_by(User.name.desc())
+        order = [(User.name, 'desc'), (User.id, 'desc')]
     elif sort == 'oldest':
-        query = query.order_by(User.join_date.asc())
+        order = [(joined, 'asc'), (User.id, 'asc')]
     else:
-        query = query.order_by(User.join_date.desc())
+        order = [(joined, 'desc'), (User.id, 'desc')]
 
-    pagination = query.paginate(page=page, per_page=per_page, error_out=False)
+    pagination = keyset_paginate(query, order, cursor=cursor, per_page=per_page)
     return render_template('admin/manage_users.html', users=pagination.items, pagination=pagination, q=q, role=role, sort=sort, per_page=per_page)
 
 @admin_bp.route('/manage_users/update_role/<int:user_id>', methods=['POST'])
@@ -74,6 +83,7 @@ def update_user_role(user_id):
 @admin_required
 def delete_user(user_id):
     user = User.query.get_or_404(user_id)
+    release_upload(user.picture)
     db.session.delete(user)
     db.session.commit()
     flash('User deleted.', 'success')
@@ -95,10 +105,9 @@ def update_user(user_id):
         filename = secure_filename(file.filename)
         ext = os.path.splitext(filename)[1].lower()
         if ext in ['.jpg','.jpeg','.png','.gif','.webp']:
-            unique = f"{uuid.uuid4().hex}{ext}"
-            save_path = os.path.join(current_app.config['UPLOAD_FOLDER'], unique)
-            file.save(save_path)
-            user.picture = f"uploads/avatars/{unique}"
+            old_picture = user.picture
+            user.picture = save_upload(file, ext)
+            release_upload(old_picture)
     db.session.commit()
     flash('User updated.', 'success')
     return redirect(url_for('admin.manage_users', **request.args))
@@ -109,16 +118,19 @@ def update_user(user_id):
 @admin_required
 def manage_products():
     q = request.args.get('q', '', type=str).strip()
-    page = request.args.get('page', 1, type=int)
-    per_page = request.args.get('per_page', 12, type=int)
+    cursor = request.args.get('cursor', type=str)
+    per_page = clamp_per_page(request.args.get('per_page', 12, type=int))
 
     query = Product.query
+    rank = None
     if q:
-        like = f"%{q}%"
-        query = query.filter((Product.title.ilike(like)) | (Product.description.ilike(like)))
+        query, rank = search_products(query, q)
 
-    query = query.order_by(Product.created_at.desc())
-    pagination = query.paginate(page=page, per_page=per_page, error_out=False)
+    if rank is not None:
+        order = [(rank, 'asc'), (Product.id, 'desc')]
+    else:
+        order = [(Product.created_at, 'desc'), (Product.id, 'desc')]
+    pagination = keyset_paginate(query, order, cursor=cursor, per_page=per_page)
     return render_template('admin/products.html', products=pagination.items, pagination=pagination, q=q)
 
 
@@ -126,12 +138,10 @@ def manage_products():
 @admin_required
 def create_product():
     from forms.product_form import ProductForm
-    from models.category import Category, SubCategory
     form = ProductForm()
-    # populate category choices
-    cats = Category.query.order_by(Category.name).all()
-    form.category.choices = [(0, '--- Select Category ---')] + [(c.id, c.name) for c in cats]
-    form.subcategory.choices = [(0, '--- Select Sub-category ---')]
+    # populate choices from the cached category tree
+    form.category.choices = [(0, '--- Select Category ---')] + category_choices()
+    form.subcategory.choices = [(0, '--- Select Sub-category ---')] + subcategory_choices(form.category.data)
 
     if request.method == 'POST' and form.validate_on_submit():
         title = form.title.data.strip()
@@ -153,10 +163,8 @@ def create_product():
             filename = secure_filename(file.filename)
             ext = os.path.splitext(filename)[1].lower()
             if ext in ['.jpg','.jpeg','.png','.gif','.webp']:
-                unique = f"{uuid.uuid4().hex}{ext}"
-                save_path = os.path.join(current_app.config['PRODUCTS_UPLOAD_FOLDER'], unique)
-                file.save(save_path)
-                image_path = f"uploads/products/{unique}"
+                image_path = save_upload(file, ext)
+                generate_renditions(image_path)
 
         p = Product(title=title, description=description, specifications=specifications, price=price, active=active, seller_id=session.get('user_id'), seller_email=seller_email, image=image_path, category_id=category_id, subcategory_id=subcategory_id)
         db.session.add(p)
@@ -171,13 +179,13 @@ def create_product():
 @admin_required
 def edit_product(product_id):
     from forms.product_form import ProductForm
-    from models.category import Category, SubCategory
     product = Product.query.get_or_404(product_id)
     form = ProductForm(obj=product)
-    cats = Category.query.order_by(Category.name).all()
-    form.category.choices = [(0, '--- Select Category ---')] + [(c.id, c.name) for c in cats]
-    subs = SubCategory.query.filter_by(category_id=product.category_id).order_by(SubCategory.name).all() if product.category_id else []
-    form.subcategory.choices = [(0, '--- Select Sub-category ---')] + [(s.id, s.name) for s in subs]
+    if request.method == 'GET':
+        form.category.data = product.category_id or 0
+        form.subcategory.data = product.subcategory_id or 0
+    form.category.choices = [(0, '--- Select Category ---')] + category_choices()
+    form.subcategory.choices = [(0, '--- Select Sub-category ---')] + subcategory_choices(form.category.data)
 
     if request.method == 'POST' and form.validate_on_submit():
         product.title = form.title.data.strip()
@@ -200,10 +208,10 @@ def edit_product(product_id):
             filename = secure_filename(file.filename)
             ext = os.path.splitext(filename)[1].lower()
             if ext in ['.jpg','.jpeg','.png','.gif','.webp']:
-                unique = f"{uuid.uuid4().hex}{ext}"
-                save_path = os.path.join(current_app.config['PRODUCTS_UPLOAD_FOLDER'], unique)
-                file.save(save_path)
-                product.image = f"uploads/products/{unique}"
+                old_image = product.image
+                product.image = save_upload(file, ext)
+                generate_renditions(product.image)
+                release_upload(old_image)
         db.session.commit()
         flash('Product updated.', 'success')
         return redirect(url_for('admin.manage_products'))
@@ -215,6 +223,7 @@ def edit_product(product_id):
 @admin_required
 def delete_product(product_id):
     product = Product.query.get_or_404(product_id)
+    release_upload(product.image)
     db.session.delete(product)
     db.session.commit()
     flash('Product deleted.', 'success')
@@ -234,14 +243,8 @@ def toggle_product(product_id):
 @admin_bp.route('/products/cleanup', methods=['POST'])
 @admin_required
 def cleanup_products():
-    from datetime import datetime, timedelta
-    days = current_app.config.get('PRODUCT_MAX_DAYS', 30)
-    cutoff = datetime.utcnow() - timedelta(days=days)
-    old = Product.query.filter(Product.created_at < cutoff).all()
-    count = len(old)
-    for p in old:
-        db.session.delete(p)
-    db.session.commit()
-    flash(f'Cleanup completed. Removed {count} products older than {days} days.', 'success')
+    # Listings go by expires_at; see utils.expiry
+    result = expire_products(delete=True)
+    flash(f'Cleanup completed. Removed {result.processed} expired products.', 'success')
     return redirect(url_for('admin.manage_products'))
 
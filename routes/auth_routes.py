@@ -1,12 +1,13 @@
-from flask import Blueprint, render_template, redirect, url_for, request, flash, session, current_app
+from flask import Blueprint, render_template, redirect, url_for, request, flash, session
 from flask_login import login_required
 from db import db
 from models.user import User
 from forms.register_form import RegisterForm
 from forms.login_form import LoginForm
+from utils.cart import CartService
+from utils.storage import save_upload
 import hashlib
 import os
-import uuid
 from werkzeug.utils import secure_filename
 
 auth_bp = Blueprint('auth', __name__, template_folder='../templates/auth', static_folder='../static')
@@ -22,10 +23,7 @@ def register():
             filename = secure_filename(file.filename)
             ext = os.path.splitext(filename)[1].lower()
             if ext in ['.jpg','.jpeg','.png','.gif','.webp']:
-                unique = f"{uuid.uuid4().hex}{ext}"
-                save_path = os.path.join(current_app.config['UPLOAD_FOLDER'], unique)
-                file.save(save_path)
-                picture_path = f"uploads/avatars/{unique}"
+                picture_path = save_upload(file, ext)
 
         user = User(name=form.name.data, email=form.email.data, mobile=form.mobile.data,
                     location=form.location.data, profession=form.profession.data,
@@ -49,6 +47,7 @@ def login():
             session['user_email'] = user.email
             session['user_role'] = user.role
             session['user_picture'] = user.picture  # Store profile picture path
+            CartService.for_current_user().remember()  # Prime the navbar cart badge
             flash('Logged in successfully.', 'success')
             if user.role == 'admin':
                 return redirect(url_for('admin.dashboard'))
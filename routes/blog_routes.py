@@ -1,4 +1,4 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, session, current_app, send_from_directory
+from flask import Blueprint, render_template, request, redirect, url_for, flash, session, send_from_directory, jsonify
 from db import db
 from models.post import Post
 from models.blog_taxonomy import BlogCategory, BlogSubCategory
@@ -7,12 +7,24 @@ from models.blog_comment import BlogComment
 from models.user import User
 from models.like import Like
 from models.comment_reply import CommentReply
+from utils.storage import save_upload, release_upload
+from utils.delivery import media_url
+from utils.conditional import conditional_get, latest, list_state
+from utils.pagination import keyset_paginate, clamp_per_page
+from utils.blog_tags import normalize_tag, tag_cloud, tag_filter
+from utils.search import search_posts, post_snippets
+from utils.uploads import (UploadError, append_chunk, cancel_upload, chunk_bytes, finish_upload,
+                           get_upload, start_upload)
+from sqlalchemy import exists, func, select
+from sqlalchemy.orm import selectinload
 import os
-import uuid
 from werkzeug.utils import secure_filename
 
 blog_bp = Blueprint('blog', __name__)
 
+LATEST_POSTS = 5
+COMMENTS_PER_PAGE = 20
+
 ALLOWED_EXT = set(['.jpg', '.jpeg', '.png', '.gif', '.webp', '.mp4', '.webm', '.ogg', '.mp3', '.wav', '.pdf', '.doc', '.docx', '.ppt', '.pptx'])
 
 
@@ -42,25 +54,96 @@ def blog_list():
     query = Post.query
     if cat:
         query = query.filter(Post.category_id == cat)
-    if q:
-        like = f"%{q}%"
-        query = query.filter((Post.title.ilike(like)) | (Post.body.ilike(like)) | (Post.tags.ilike(like)))
     if tag:
-        query = query.filter(Post.tags.ilike(f"%{tag}%"))
+        query = tag_filter(query, tag)
+    rank = None
+    if q:
+        query, rank = search_posts(query, q)
 
-    posts = query.order_by(Post.created_at.desc()).all()
+    cursor = request.args.get('cursor', type=str)
+    per_page = clamp_per_page(request.args.get('per_page', 12, type=int))
+    # Searches list best matches first; browsing lists newest first
+    if rank is not None:
+        order = [(rank, 'asc'), (Post.id, 'desc')]
+    else:
+        order = [(Post.created_at, 'desc'), (Post.id, 'desc')]
+    pagination = keyset_paginate(query, order, cursor=cursor, per_page=per_page)
+    snippets = post_snippets(q, [p.id for p in pagination.items]) if rank is not None else {}
     categories = BlogCategory.query.order_by(BlogCategory.name.asc()).all()
-    latest = Post.query.order_by(Post.created_at.desc()).limit(5).all()
-    return render_template('blog_list.html', posts=posts, categories=categories, latest=latest, q=q, cat=cat)
+    return render_template('blog_list.html', posts=pagination.items, pagination=pagination, snippets=snippets,
+                           categories=categories, tags=tag_cloud(), q=q, cat=cat, tag=normalize_tag(tag),
+                           per_page=per_page)
+
+
+def _blog_post_state(post_id):
+    """Validator for blog_post: the post, its media/comments/replies/likes and the latest list."""
+    post_comments = select(BlogComment.id).where(BlogComment.post_id == post_id)
+    children = (
+        (BlogComment.created_at, BlogComment.post_id == post_id),
+        (CommentReply.created_at, CommentReply.comment_id.in_(post_comments)),
+        (Like.created_at, Like.post_id == post_id),
+        (BlogMedia.uploaded_at, BlogMedia.post_id == post_id),
+    )
+    columns = [Post.updated_at]
+    for stamp, where in children:
+        # Counts catch deletions, which don't move the newest timestamp
+        columns.append(select(func.max(stamp)).where(where).correlate(None).scalar_subquery())
+        columns.append(select(func.count()).select_from(stamp.table).where(where).correlate(None).scalar_subquery())
+    # The "latest posts" sidebar
+    columns.extend(list_state(
+        select(Post.id, Post.updated_at).order_by(Post.created_at.desc()).limit(LATEST_POSTS)))
+    row = db.session.execute(select(*columns).where(Post.id == post_id)).first()
+    if row is None:
+        return None
+    return tuple(row), latest(row[0], *row[1::2])
+
+
+def _comment_page(post_id, cursor, per_page=COMMENTS_PER_PAGE):
+    """One page of a post's top-level comments, oldest first, replies loaded in one extra query."""
+    query = BlogComment.query.filter_by(post_id=post_id).options(selectinload(BlogComment.replies))
+    order = [(BlogComment.created_at, 'asc'), (BlogComment.id, 'asc')]
+    return keyset_paginate(query, order, cursor=cursor, per_page=per_page)
 
 
 @blog_bp.route('/<int:post_id>')
+@conditional_get(_blog_post_state)
 def blog_post(post_id):
     post = Post.query.get_or_404(post_id)
     media = BlogMedia.query.filter_by(post_id=post.id).all()
-    comments = BlogComment.query.filter_by(post_id=post.id).order_by(BlogComment.created_at.asc()).all()
-    latest = Post.query.order_by(Post.created_at.desc()).limit(5).all()
-    return render_template('blog_post.html', post=post, media=media, comments=comments, latest=latest)
+    comments = _comment_page(post.id, request.args.get('comments', type=str))
+    latest = Post.query.order_by(Post.created_at.desc()).limit(LATEST_POSTS).all()
+    user_id = session.get('user_id')
+    user_has_liked = bool(user_id) and db.session.query(
+        exists().where(Like.post_id == post.id, Like.user_id == user_id, Like.comment_id.is_(None))).scalar()
+    return render_template('blog_post.html', post=post, media=media, comments=comments.items,
+                           comments_page=comments, latest=latest, user_has_liked=user_has_liked)
+
+
+@blog_bp.route('/<int:post_id>/comments')
+def comment_feed(post_id):
+    """"Load more" JSON for blog_post: the next page of top-level comments with their replies."""
+    page = _comment_page(post_id, request.args.get('cursor', type=str))
+    is_admin = session.get('user_role') == 'admin'
+
+    def entry(c):
+        return {
+            'author': c.author_name or 'Anonymous',
+            'created_at': c.created_at.strftime('%b %d, %Y %H:%M') if c.created_at else '',
+            'body': c.body,
+        }
+
+    items = []
+    for c in page.items:
+        item = entry(c)
+        item.update({
+            'id': c.id,
+            'replies': [entry(r) for r in c.replies],
+            'reply_url': url_for('blog.reply_comment', comment_id=c.id),
+            'delete_url': url_for('blog.admin_delete_comment', comment_id=c.id) if is_admin else None,
+        })
+        items.append(item)
+    next_url = url_for('blog.comment_feed', post_id=post_id, cursor=page.next_cursor) if page.has_next else None
+    return jsonify({'items': items, 'next': next_url})
 
 
 @blog_bp.route('/create', methods=['GET', 'POST'])
@@ -89,6 +172,12 @@ def create():
         db.session.add(post)
         db.session.commit()
 
+        # Large files arrive beforehand through the chunked upload API
+        for upload_id in request.form.getlist('upload_ids'):
+            upload = get_upload(upload_id, session.get('user_id'))
+            if upload is not None and upload.received == upload.size:
+                _attach_upload(upload, post)
+
         # handle uploads
         for file in request.files.getlist('media'):
             if file and file.filename:
@@ -96,13 +185,8 @@ def create():
                 ext = os.path.splitext(filename)[1].lower()
                 if not allowed_file_ext(filename):
                     continue
-                unique = f"{uuid.uuid4().hex}{ext}"
-                folder = os.path.join(current_app.root_path, 'static', 'uploads', 'blog')
-                os.makedirs(folder, exist_ok=True)
-                save_path = os.path.join(folder, unique)
-                file.save(save_path)
                 media_type = detect_media_type(ext)
-                m = BlogMedia(post_id=post.id, file_path=f"uploads/blog/{unique}", media_type=media_type)
+                m = BlogMedia(post_id=post.id, file_path=save_upload(file, ext), media_type=media_type)
                 db.session.add(m)
         db.session.commit()
 
@@ -181,12 +265,7 @@ def admin_delete_post(post_id):
     # delete media files
     media_items = BlogMedia.query.filter_by(post_id=p.id).all()
     for m in media_items:
-        try:
-            path = os.path.join(current_app.root_path, 'static', m.file_path)
-            if os.path.exists(path):
-                os.remove(path)
-        except Exception:
-            pass
+        release_upload(m.file_path)
         db.session.delete(m)
     # delete comments
     BlogComment.query.filter_by(post_id=p.id).delete()
@@ -209,6 +288,95 @@ def admin_delete_comment(comment_id):
     return redirect(url_for('blog.admin_categories'))
 
 
+# Chunked upload API (see utils.uploads)
+def _upload_state(upload):
+    return {
+        'success': True,
+        'id': upload.id,
+        'offset': upload.received,
+        'size': upload.size,
+        'chunk_size': chunk_bytes(),
+        'url': url_for('blog.upload_chunk', upload_id=upload.id),
+    }
+
+
+def _upload_error(e):
+    body = {'success': False, 'msg': str(e)}
+    if e.offset is not None:
+        body['offset'] = e.offset
+    return body, e.status
+
+
+def _attach_upload(upload, post):
+    media = BlogMedia(post_id=post.id, file_path=finish_upload(upload), media_type=detect_media_type(upload.ext))
+    db.session.add(media)
+    return media
+
+
+@blog_bp.route('/uploads', methods=['POST'])
+def upload_start():
+    """Open a resumable upload: JSON {filename, size}."""
+    user_id = session.get('user_id')
+    if not user_id:
+        return {'success': False, 'msg': 'Login required'}, 401
+    data = request.get_json(silent=True) or {}
+    filename = secure_filename(data.get('filename') or '')
+    if not filename or not allowed_file_ext(filename):
+        return {'success': False, 'msg': 'File type not allowed'}, 400
+    try:
+        upload = start_upload(user_id, filename, os.path.splitext(filename)[1].lower(), data.get('size'))
+    except UploadError as e:
+        return _upload_error(e)
+    db.session.commit()
+    return _upload_state(upload), 201
+
+
+@blog_bp.route('/uploads/<upload_id>', methods=['GET', 'PATCH', 'DELETE'])
+def upload_chunk(upload_id):
+    """GET: where to resume. PATCH: append raw bytes at Upload-Offset. DELETE: cancel."""
+    upload = get_upload(upload_id, session.get('user_id'))
+    if upload is None:
+        return {'success': False, 'msg': 'Unknown upload'}, 404
+    if request.method == 'DELETE':
+        cancel_upload(upload)
+        db.session.commit()
+        return {'success': True}, 200
+    if request.method == 'PATCH':
+        offset = request.headers.get('Upload-Offset', type=int)
+        if offset is None:
+            return {'success': False, 'msg': 'Upload-Offset header is required', 'offset': upload.received}, 400
+        try:
+            # Read the body as a stream; it is never buffered in memory
+            append_chunk(upload, offset, request.stream, request.content_length,
+                         request.headers.get('X-Chunk-SHA256'))
+        except UploadError as e:
+            db.session.rollback()
+            return _upload_error(e)
+        db.session.commit()
+    return _upload_state(upload), 200
+
+
+@blog_bp.route('/uploads/<upload_id>/complete', methods=['POST'])
+def upload_complete(upload_id):
+    """Attach a finished upload to a post the caller owns: JSON {post_id}."""
+    user_id = session.get('user_id')
+    upload = get_upload(upload_id, user_id)
+    if upload is None:
+        return {'success': False, 'msg': 'Unknown upload'}, 404
+    post = db.session.get(Post, (request.get_json(silent=True) or {}).get('post_id') or 0)
+    if post is None:
+        return {'success': False, 'msg': 'Unknown post'}, 404
+    if post.author_id != user_id and session.get('user_role') != 'admin':
+        return {'success': False, 'msg': 'Not allowed'}, 403
+    try:
+        media = _attach_upload(upload, post)
+    except UploadError as e:
+        return _upload_error(e)
+    db.session.commit()
+    return {'success': True, 'media_id': media.id, 'file_path': media.file_path,
+            'url': media_url(media.file_path), 'media_type': media.media_type}, 201
+
+
 # Like endpoint (API)
 @blog_bp.route('/like/<int:post_id>', methods=['POST'])
 def like_post(post_id):
@@ -222,19 +390,13 @@ def like_post(post_id):
     existing = Like.query.filter_by(post_id=post.id, user_id=user_id, comment_id=None).first()
     if existing:
         db.session.delete(existing)
-        db.session.commit()
-        # Reload the post to get updated like count
-        post = Post.query.get(post_id)
-        like_count = len(post.likes) if post.likes else 0
-        return {'success': True, 'action': 'unliked', 'count': like_count}, 200
+        action = 'unliked'
     else:
-        like = Like(post_id=post.id, user_id=user_id)
-        db.session.add(like)
-        db.session.commit()
-        # Reload the post to get updated like count
-        post = Post.query.get(post_id)
-        like_count = len(post.likes) if post.likes else 0
-        return {'success': True, 'action': 'liked', 'count': like_count}, 200
+        db.session.add(Like(post_id=post.id, user_id=user_id))
+        action = 'liked'
+    # utils.blog_counters moves post.like_count in the same transaction
+    db.session.commit()
+    return {'success': True, 'action': action, 'count': post.like_count}, 200
 
 
 # Reply to comment endpoint
@@ -4,6 +4,7 @@ from utils import admin_required
 from models.category import Category
 from models.consultant import Consultant
 from forms.consultancy_forms import ConsultantApplicationForm
+from utils.storage import save_upload, release_upload
 from werkzeug.utils import secure_filename
 import os
 from db import db
@@ -27,12 +28,8 @@ def apply_consultant():
             profile_picture_path = None
             if form.profile_picture.data:
                 filename = secure_filename(form.profile_picture.data.filename)
-                # Save to uploads/consultants directory
-                filepath = os.path.join('static', 'uploads', 'consultants', filename)
-                os.makedirs(os.path.dirname(filepath), exist_ok=True)
-                form.profile_picture.data.save(filepath)
-                # Store relative path from static directory
-                profile_picture_path = os.path.join('uploads', 'consultants', filename)
+                ext = os.path.splitext(filename)[1].lower()
+                profile_picture_path = save_upload(form.profile_picture.data, ext)
 
             new_consultant = Consultant(
                 name=form.name.data,
@@ -112,14 +109,8 @@ def delete_consultant(id):
     # Store consultant name for flash message
     consultant_name = consultant.name
     
-    # Delete associated profile picture file if it exists
-    if consultant.profile_picture:
-        try:
-            profile_path = os.path.join('static', consultant.profile_picture)
-            if os.path.exists(profile_path):
-                os.remove(profile_path)
-        except Exception as e:
-            print(f"Warning: Could not delete profile picture: {e}")
+    # Release the profile picture; the file is removed once nothing uses it
+    release_upload(consultant.profile_picture)
     
     # Delete the consultant from database
     db.session.delete(consultant)
@@ -2,9 +2,19 @@ from flask import Blueprint, render_template, request, redirect, url_for, flash,
 from db import db
 from models.product import Product
 from models.cart_item import CartItem
-from models.category import Category, SubCategory
+from utils.search import search_products
+from utils.pagination import keyset_paginate, clamp_per_page
+from utils.related import get_related_products
+from utils.cart import CartService
+from utils.images import generate_renditions, rendition_url, rendition_srcset
+from utils.storage import save_upload, release_upload
+from utils.facets import PRICE_BUCKETS, price_bucket_filter, facet_counts
+from utils.taxonomy import category_tree, taxonomy_json, subcategory_choices
+from utils.conditional import conditional_get, latest
+from models.product_related import ProductRelated
+from sqlalchemy import func, select
+from sqlalchemy.orm import aliased
 import os
-import uuid
 from werkzeug.utils import secure_filename
 from functools import wraps
 
@@ -38,27 +48,6 @@ def product_owner_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
-# Cart helper functions
-def get_cart_items():
-    """Get cart items for logged in user from database"""
-    if not session.get('user_id'):
-        return []
-    return CartItem.query.filter_by(user_id=session['user_id']).all()
-
-def get_cart_count():
-    """Get total number of items in cart"""
-    cart_items = get_cart_items()
-    return sum(item.quantity for item in cart_items)
-
-def get_cart_total():
-    """Get total price of all items in cart"""
-    cart_items = get_cart_items()
-    total = 0
-    for item in cart_items:
-        if item.product and item.product.active:
-            total += item.product.price * item.quantity
-    return total
-
 @ecommerce_bp.route('/cart')
 def cart_view():
     """View cart contents"""
@@ -66,22 +55,46 @@ def cart_view():
         flash('Please log in to view your cart.', 'warning')
         return redirect(url_for('auth.login'))
     
-    cart_items = get_cart_items()
-    cart_data = []
-    total = 0
-    
-    for item in cart_items:
-        if item.product and item.product.active:
-            subtotal = item.product.price * item.quantity
-            total += subtotal
-            cart_data.append({
-                'item': item,
-                'product': item.product,
-                'quantity': item.quantity,
-                'subtotal': subtotal
-            })
-    
-    return render_template('ecommerce/cart.html', cart_items=cart_data, total=total, cart_count=get_cart_count())
+    cart = CartService.for_current_user()
+    cart_items = cart.lines()
+    # Viewing the cart also resyncs the navbar badge (e.g. after a product
+    # in it was deactivated by its seller)
+    summary = cart.remember()
+    return render_template('ecommerce/cart.html', cart_items=cart_items, total=summary.total, cart_count=summary.count)
+
+@ecommerce_bp.route('/cart', methods=['PATCH'])
+@login_required
+def update_cart_batch():
+    """Apply several quantity changes in one transaction (JSON API).
+
+    Body: [{"product_id": 1, "quantity": 3}, ...] or {"items": [...]};
+    a quantity of 0 removes the line. Returns the updated lines and totals.
+    """
+    payload = request.get_json(silent=True)
+    if isinstance(payload, dict):
+        payload = payload.get('items')
+    if not isinstance(payload, list):
+        return jsonify({'success': False, 'message': 'Expected a list of {product_id, quantity}.'}), 400
+
+    changes = {}
+    try:
+        for change in payload:
+            changes[int(change['product_id'])] = int(change['quantity'])
+    except (KeyError, TypeError, ValueError):
+        return jsonify({'success': False, 'message': 'Invalid product_id or quantity.'}), 400
+
+    cart = CartService.for_current_user()
+    cart.apply_changes(changes)
+    db.session.commit()
+
+    lines = cart.lines()
+    summary = cart.remember(bump=True)
+    return jsonify({
+        'success': True,
+        'lines': [{'product_id': line.product.id, 'quantity': line.quantity, 'subtotal': round(line.subtotal, 2)} for line in lines],
+        'cart_count': summary.count,
+        'total': round(summary.total, 2)
+    })
 
 @ecommerce_bp.route('/add-to-cart/<int:product_id>', methods=['POST'])
 @login_required
@@ -100,23 +113,10 @@ def add_to_cart(product_id):
             flash('Invalid quantity.', 'error')
             return redirect(url_for('ecommerce.product_detail', product_id=product_id))
         
-        # Check if item already exists in cart
-        existing_item = CartItem.query.filter_by(
-            user_id=session['user_id'],
-            product_id=product_id
-        ).first()
-        
-        if existing_item:
-            existing_item.quantity += quantity
-        else:
-            new_item = CartItem(
-                user_id=session['user_id'],
-                product_id=product_id,
-                quantity=quantity
-            )
-            db.session.add(new_item)
-        
+        cart = CartService.for_current_user()
+        cart.add(product_id, quantity)
         db.session.commit()
+        cart.changed()
         flash(f'Added {quantity} x {product.title} to cart!', 'success')
         
         return redirect(url_for('ecommerce.product_detail', product_id=product_id))
@@ -140,28 +140,15 @@ def add_to_cart_ajax(product_id):
         if quantity <= 0:
             return jsonify({'success': False, 'message': 'Invalid quantity.'})
         
-        # Check if item already exists in cart
-        existing_item = CartItem.query.filter_by(
-            user_id=session['user_id'],
-            product_id=product_id
-        ).first()
-        
-        if existing_item:
-            existing_item.quantity += quantity
-        else:
-            new_item = CartItem(
-                user_id=session['user_id'],
-                product_id=product_id,
-                quantity=quantity
-            )
-            db.session.add(new_item)
-        
+        cart = CartService.for_current_user()
+        cart.add(product_id, quantity)
         db.session.commit()
+        summary = cart.changed()
         
         return jsonify({
             'success': True,
             'message': f'Added {quantity} x {product.title} to cart!',
-            'cart_count': get_cart_count()
+            'cart_count': summary.count
         })
         
     except ValueError:
@@ -193,6 +180,7 @@ def update_cart(product_id):
             cart_item.quantity = quantity
             db.session.commit()
             flash('Cart updated.', 'success')
+        CartService.for_current_user().changed()
         
         return redirect(url_for('ecommerce.cart_view'))
         
@@ -212,6 +200,7 @@ def remove_from_cart(product_id):
     if cart_item:
         db.session.delete(cart_item)
         db.session.commit()
+        CartService.for_current_user().changed()
         flash('Item removed from cart.', 'success')
     else:
         flash('Item not in cart.', 'error')
@@ -224,41 +213,110 @@ def clear_cart():
     """Clear entire cart"""
     CartItem.query.filter_by(user_id=session['user_id']).delete()
     db.session.commit()
+    CartService.for_current_user().changed()
     flash('Cart cleared.', 'success')
     return redirect(url_for('ecommerce.cart_view'))
 
 @ecommerce_bp.route('/cart-count')
 def cart_count():
     """Get cart count for AJAX requests"""
-    return jsonify({'count': get_cart_count()})
+    cart = CartService.for_current_user()
+    return jsonify({'count': cart.summary().count if cart else 0})
 
-@ecommerce_bp.route('/')
-def product_list():
+# Keyset sort orders for the product listing; each ends on the unique id
+PRODUCT_SORTS = {
+    'newest': [(Product.created_at, 'desc'), (Product.id, 'desc')],
+    # price is always set (default 0.0); sorting the raw column keeps the order indexable
+    'price_asc': [(Product.price, 'asc'), (Product.id, 'asc')],
+    'price_desc': [(Product.price, 'desc'), (Product.id, 'desc')],
+    'title_asc': [(Product.title, 'asc'), (Product.id, 'asc')],
+    'title_desc': [(Product.title, 'desc'), (Product.id, 'desc')],
+}
+
+def _product_listing():
+    """Shared query/sort/cursor handling for product_list and product_feed."""
     q = request.args.get('q', '', type=str).strip()
-    sort = request.args.get('sort', 'newest', type=str)
-    page = request.args.get('page', 1, type=int)
-    per_page = request.args.get('per_page', 12, type=int)
+    sort = request.args.get('sort', '', type=str)
+    cursor = request.args.get('cursor', type=str)
+    per_page = clamp_per_page(request.args.get('per_page', 12, type=int))
+
+    category_id = request.args.get('category', type=int)
+    subcategory_id = request.args.get('subcategory', type=int) if category_id else None
+    bucket = request.args.get('price', type=int)
+    if bucket is not None and not 0 <= bucket < len(PRICE_BUCKETS):
+        bucket = None
 
     query = Product.query.filter_by(active=True)
+    if category_id:
+        query = query.filter(Product.category_id == category_id)
+    if subcategory_id:
+        query = query.filter(Product.subcategory_id == subcategory_id)
+    if bucket is not None:
+        query = query.filter(price_bucket_filter(bucket))
+    rank = None
     if q:
-        like = f"%{q}%"
-        query = query.filter((Product.title.ilike(like)) | (Product.description.ilike(like)))
-
-    if sort == 'price_asc':
-        query = query.order_by(Product.price.asc())
-    elif sort == 'price_desc':
-        query = query.order_by(Product.price.desc())
-    elif sort == 'title_asc':
-        query = query.order_by(Product.title.asc())
-    elif sort == 'title_desc':
-        query = query.order_by(Product.title.desc())
+        query, rank = search_products(query, q)
+
+    # Searches default to best-match ordering; plain browsing to newest first
+    if not sort:
+        sort = 'relevance' if rank is not None else 'newest'
+
+    if sort == 'relevance' and rank is not None:
+        order = [(rank, 'asc'), (Product.id, 'desc')]
     else:
-        query = query.order_by(Product.created_at.desc())
+        if sort not in PRODUCT_SORTS:
+            sort = 'newest'
+        order = PRODUCT_SORTS[sort]
+
+    pagination = keyset_paginate(query, order, cursor=cursor, per_page=per_page)
+    filters = {'category': category_id, 'subcategory': subcategory_id, 'price': bucket}
+    return pagination, q, sort, per_page, filters
 
-    pagination = query.paginate(page=page, per_page=per_page, error_out=False)
-    return render_template('ecommerce/product_list.html', products=pagination.items, pagination=pagination, q=q, sort=sort, per_page=per_page, is_admin=(session.get('user_role')=='admin'))
+@ecommerce_bp.route('/')
+def product_list():
+    pagination, q, sort, per_page, filters = _product_listing()
+    facets = facet_counts(filters['category'], filters['subcategory'], filters['price'])
+    return render_template('ecommerce/product_list.html', products=pagination.items, pagination=pagination, q=q, sort=sort, per_page=per_page, filters=filters, facets=facets, is_admin=(session.get('user_role')=='admin'))
+
+@ecommerce_bp.route('/feed')
+def product_feed():
+    """Infinite-scroll JSON feed: compact product cards plus the next cursor."""
+    pagination, q, sort, per_page, filters = _product_listing()
+    items = []
+    for p in pagination.items:
+        image = rendition_url(p.image, 'card') if p.image else None
+        items.append({
+            'id': p.id,
+            'title': p.title,
+            'price': round(p.price or 0, 2),
+            'excerpt': (p.description or '')[:100],
+            'image': image,
+            'image_srcset': rendition_srcset(p.image, 'jpg') if p.image else '',
+            'url': url_for('ecommerce.product_detail', product_id=p.id),
+            'add_to_cart_url': url_for('ecommerce.add_to_cart', product_id=p.id),
+        })
+    next_url = url_for('ecommerce.product_feed', cursor=pagination.next_cursor, q=q or None, sort=sort, per_page=per_page, **filters) if pagination.has_next else None
+    return jsonify({'items': items, 'next': next_url})
+
+def _product_detail_state(product_id):
+    """Validator for product_detail: the product and its related cards."""
+    related = aliased(Product)
+    ranked = ProductRelated.product_id == product_id
+    row = db.session.execute(
+        select(Product.updated_at,
+               # refresh_related rewrites every row, so this moves when the list does
+               select(func.max(ProductRelated.updated_at)).where(ranked).scalar_subquery(),
+               select(func.max(related.updated_at))
+               .join(ProductRelated, ProductRelated.related_id == related.id)
+               .where(ranked).scalar_subquery())
+        .where(Product.id == product_id)
+    ).first()
+    if row is None:
+        return None
+    return tuple(row), latest(*row)
 
 @ecommerce_bp.route('/<int:product_id>')
+@conditional_get(_product_detail_state)
 def product_detail(product_id):
     product = Product.query.get_or_404(product_id)
     
@@ -267,11 +325,8 @@ def product_detail(product_id):
     if session.get('user_id'):
         can_edit = (product.seller_id == session.get('user_id') or session.get('user_role') == 'admin')
     
-    # Get related products (simple logic - same category or random products)
-    related_products = Product.query.filter(
-        Product.id != product.id,
-        Product.active == True
-    ).limit(4).all()
+    # Neighbours are precomputed by utils.related; this is one indexed lookup
+    related_products = get_related_products(product)
     
     return render_template('ecommerce/product_detail.html', product=product, related_products=related_products, can_edit=can_edit)
 
@@ -280,8 +335,28 @@ def product_detail(product_id):
 def user_products():
     """Display user's products"""
     user_id = session.get('user_id')
-    products = Product.query.filter_by(seller_id=user_id).order_by(Product.created_at.desc()).all()
-    return render_template('ecommerce/user_products.html', products=products)
+    cursor = request.args.get('cursor', type=str)
+    per_page = clamp_per_page(request.args.get('per_page', 20, type=int), default=20)
+
+    # Summary cards: one grouped aggregate instead of loading every listing
+    summary = {'total': 0, 'active': 0, 'inactive': 0, 'active_value': 0.0}
+    rows = (db.session.query(Product.active, func.count(Product.id), func.coalesce(func.sum(Product.price), 0))
+            .filter(Product.seller_id == user_id)
+            .group_by(Product.active)
+            .all())
+    for active, count, value in rows:
+        summary['total'] += count
+        if active:
+            summary['active'] += count
+            summary['active_value'] += value
+        else:
+            summary['inactive'] += count
+
+    # ix_product_seller_created_at serves this page directly
+    order = [(Product.created_at, 'desc'), (Product.id, 'desc')]
+    pagination = keyset_paginate(Product.query.filter_by(seller_id=user_id), order, cursor=cursor, per_page=per_page)
+    return render_template('ecommerce/user_products.html', products=pagination.items, pagination=pagination,
+                           summary=summary, per_page=per_page)
 
 @ecommerce_bp.route('/create', methods=['GET','POST'])
 @login_required
@@ -307,10 +382,8 @@ def create():
             filename = secure_filename(file.filename)
             ext = os.path.splitext(filename)[1].lower()
             if ext in ['.jpg','.jpeg','.png','.gif','.webp']:
-                unique = f"{uuid.uuid4().hex}{ext}"
-                save_path = os.path.join(current_app.config['PRODUCTS_UPLOAD_FOLDER'], unique)
-                file.save(save_path)
-                image_path = f"uploads/products/{unique}"
+                image_path = save_upload(file, ext)
+                generate_renditions(image_path)
         
         p = Product(
             title=title, 
@@ -330,8 +403,7 @@ def create():
         return redirect(url_for('ecommerce.user_products'))
     
     # GET request - show form
-    categories = Category.query.order_by(Category.name).all()
-    return render_template('ecommerce/product_create.html', categories=categories)
+    return render_template('ecommerce/product_create.html', categories=category_tree())
 
 @ecommerce_bp.route('/<int:product_id>/edit', methods=['GET','POST'])
 @product_owner_required
@@ -356,22 +428,22 @@ def edit(product_id):
             filename = secure_filename(file.filename)
             ext = os.path.splitext(filename)[1].lower()
             if ext in ['.jpg','.jpeg','.png','.gif','.webp']:
-                unique = f"{uuid.uuid4().hex}{ext}"
-                save_path = os.path.join(current_app.config['PRODUCTS_UPLOAD_FOLDER'], unique)
-                file.save(save_path)
-                product.image = f"uploads/products/{unique}"
+                old_image = product.image
+                product.image = save_upload(file, ext)
+                generate_renditions(product.image)
+                release_upload(old_image)
         
         db.session.commit()
         flash('Product updated successfully!', 'success')
         return redirect(url_for('ecommerce.product_detail', product_id=product.id))
     
-    categories = Category.query.order_by(Category.name).all()
-    return render_template('ecommerce/product_create.html', product=product, categories=categories)
+    return render_template('ecommerce/product_create.html', product=product, categories=category_tree())
 
 @ecommerce_bp.route('/<int:product_id>/delete', methods=['POST'])
 @product_owner_required
 def delete(product_id):
     product = Product.query.get_or_404(product_id)
+    release_upload(product.image)
     db.session.delete(product)
     db.session.commit()
     flash('Product deleted successfully.', 'success')
@@ -388,11 +460,17 @@ def toggle_product(product_id):
     flash(f'Product {status} successfully.', 'success')
     return redirect(request.referrer or url_for('ecommerce.user_products'))
 
+@ecommerce_bp.route('/taxonomy.json')
+def taxonomy():
+    """Whole category tree; cached in-process, revalidated by browsers via ETag"""
+    payload, etag = taxonomy_json()
+    response = current_app.response_class(payload, mimetype='application/json')
+    response.set_etag(etag)
+    response.cache_control.public = True
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
 @ecommerce_bp.route('/subcategories/<int:category_id>')
 def get_subcategories(category_id):
-    """AJAX endpoint to get subcategories for a category"""
-    subcategories = SubCategory.query.filter_by(category_id=category_id).order_by(SubCategory.name).all()
-    return jsonify([{
-        'id': sub.id,
-        'name': sub.name
-    } for sub in subcategories])
+    """AJAX endpoint to get subcategories for a category (served from the cached tree)"""
+    return jsonify([{'id': sid, 'name': name} for sid, name in subcategory_choices(category_id)])
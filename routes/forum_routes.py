@@ -1,9 +1,13 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash, session
 from db import db
 from models.forum import ForumCategory, Thread, Reply
+from utils.conditional import conditional_get, latest, list_state
+from sqlalchemy import func, select
 
 forum_bp = Blueprint('forum', __name__, template_folder='../templates/discussion_forum')
 
+SIDEBAR_THREADS = 5
+
 @forum_bp.route('/')
 def forum_home():
     latest_threads = Thread.query.order_by(Thread.created_at.desc()).limit(5).all()
@@ -26,14 +30,35 @@ def forum_search():
                          query=q, 
                          categories=categories)
 
+def _thread_view_state(thread_id):
+    """Validator for thread_view: the thread, its replies and the sidebar lists."""
+    replies = Reply.thread_id == thread_id
+    category_id = select(Thread.category_id).where(Thread.id == thread_id).correlate(None).scalar_subquery()
+    newest = select(Thread.id, Thread.updated_at).order_by(Thread.created_at.desc()).limit(SIDEBAR_THREADS)
+    columns = [
+        Thread.updated_at,
+        # Counts catch deletions, which don't move the newest timestamp
+        select(func.max(Reply.created_at)).where(replies).correlate(None).scalar_subquery(),
+        select(func.count()).select_from(Reply).where(replies).correlate(None).scalar_subquery(),
+        # Latest and related threads
+        *list_state(newest),
+        *list_state(newest.where(Thread.category_id == category_id, Thread.id != thread_id)),
+        select(func.count()).select_from(ForumCategory).scalar_subquery(),
+    ]
+    row = db.session.execute(select(*columns).where(Thread.id == thread_id)).first()
+    if row is None:
+        return None
+    return tuple(row), latest(row[0], row[1], row[3], row[5])
+
 @forum_bp.route('/thread/<int:thread_id>')
+@conditional_get(_thread_view_state)
 def thread_view(thread_id):
     thread = Thread.query.get_or_404(thread_id)
-    latest_threads = Thread.query.order_by(Thread.created_at.desc()).limit(5).all()
+    latest_threads = Thread.query.order_by(Thread.created_at.desc()).limit(SIDEBAR_THREADS).all()
     related_threads = Thread.query.filter(
         Thread.category_id == thread.category_id,
         Thread.id != thread.id
-    ).order_by(Thread.created_at.desc()).limit(5).all()
+    ).order_by(Thread.created_at.desc()).limit(SIDEBAR_THREADS).all()
     categories = ForumCategory.query.all()
     return render_template('thread_view.html', 
                          thread=thread, 
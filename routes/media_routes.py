@@ -0,0 +1,11 @@
+from flask import Blueprint
+
+from utils.delivery import send_media
+
+media_bp = Blueprint('media', __name__)
+
+
+@media_bp.route('/<path:filename>')
+def serve(filename):
+    """Uploaded media with Range, conditional requests and long-lived caching."""
+    return send_media(filename)
@@ -1,23 +1,13 @@
 """
-Utility script to remove products older than configured days.
+Utility script to remove expired products.
 Run with the application context (or import and call cleanup_old_products.cleanup()).
+The same engine is available as `flask products expire --delete`.
 """
-from datetime import datetime, timedelta
-from db import db
-from models.product import Product
-from flask import current_app
+from utils.expiry import expire_products
 
-def cleanup(days=None):
-    # days can be passed explicitly, otherwise use app config
-    if days is None:
-        days = current_app.config.get('PRODUCT_MAX_DAYS', 30)
-    cutoff = datetime.utcnow() - timedelta(days=days)
-    old = Product.query.filter(Product.created_at < cutoff).all()
-    count = len(old)
-    for p in old:
-        db.session.delete(p)
-    db.session.commit()
-    return count
+def cleanup(days=None, batch_size=500):
+    # days only applies to listings without expires_at; defaults to PRODUCT_MAX_DAYS
+    return expire_products(delete=True, days=days, batch_size=batch_size).processed
 
 if __name__ == '__main__':
     # Running standalone requires an app context; skip when called directly.
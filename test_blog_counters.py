@@ -0,0 +1,93 @@
+"""Tests for the denormalised post counters (utils/blog_counters.py)."""
+from datetime import datetime
+
+from db import db
+from models.blog_comment import BlogComment
+from models.like import Like
+from models.post import Post
+from models.user import User
+from utils.blog_counters import reconcile_counters
+
+EDITED = datetime(2024, 5, 1, 12, 0)
+
+
+def _post():
+    user = User(name='Writer', email='writer@example.com', password='x')
+    db.session.add(user)
+    db.session.flush()
+    post = Post(title='Mulching', body='Keep the soil covered', author_id=user.id, updated_at=EDITED)
+    db.session.add(post)
+    db.session.commit()
+    return user.id, post.id
+
+
+def _counters(post_id):
+    db.session.expire_all()
+    post = db.session.get(Post, post_id)
+    return post.like_count, post.comment_count
+
+
+def test_events_keep_counters_in_step(app):
+    _, post_id = _post()
+    comments = [BlogComment(post_id=post_id, author_name='A', body=str(i)) for i in range(3)]
+    db.session.add_all([*comments, Like(post_id=post_id)])
+    db.session.commit()
+    assert _counters(post_id) == (1, 3)
+
+    db.session.delete(comments[0])
+    db.session.commit()
+    assert _counters(post_id) == (1, 2)
+    # A counter tick is not an edit
+    assert db.session.get(Post, post_id).updated_at == EDITED
+
+
+def test_comment_likes_are_not_post_likes(app):
+    _, post_id = _post()
+    comment = BlogComment(post_id=post_id, author_name='A', body='hi')
+    db.session.add(comment)
+    db.session.flush()
+    db.session.add_all([Like(post_id=post_id), Like(post_id=post_id, comment_id=comment.id)])
+    db.session.commit()
+    assert _counters(post_id) == (1, 1)
+
+    with db.engine.begin() as conn:
+        assert reconcile_counters(conn) == 0
+    db.session.delete(Like.query.filter_by(comment_id=comment.id).one())
+    db.session.commit()
+    assert _counters(post_id) == (1, 1)
+
+
+def test_rollback_undoes_the_bump(app):
+    _, post_id = _post()
+    db.session.add(Like(post_id=post_id))
+    db.session.flush()
+    db.session.rollback()
+    assert _counters(post_id) == (0, 0)
+
+
+def test_like_toggle_returns_the_counter(app, client):
+    user_id, post_id = _post()
+    with client.session_transaction() as s:
+        s['user_id'] = user_id
+
+    liked = client.post(f'/blog/like/{post_id}').get_json()
+    assert (liked['action'], liked['count']) == ('liked', 1)
+    unliked = client.post(f'/blog/like/{post_id}').get_json()
+    assert (unliked['action'], unliked['count']) == ('unliked', 0)
+
+
+def test_reconcile_repairs_bulk_deletes(app):
+    _, post_id = _post()
+    db.session.add_all([Like(post_id=post_id), Like(post_id=post_id),
+                        BlogComment(post_id=post_id, author_name='A', body='hi')])
+    db.session.commit()
+    # Bulk deletes skip the ORM events
+    Like.query.filter_by(post_id=post_id).delete()
+    db.session.commit()
+    assert _counters(post_id) == (2, 1)
+
+    with db.engine.begin() as conn:
+        assert reconcile_counters(conn) == 1
+        assert reconcile_counters(conn) == 0
+    assert _counters(post_id) == (0, 1)
+    assert db.session.get(Post, post_id).updated_at == EDITED
@@ -0,0 +1,105 @@
+"""Tests for the database-backed cart (utils/cart.py and the /shop cart routes)."""
+import pytest
+
+from db import db
+from models.cart_item import CartItem
+from models.product import Product
+from models.user import User
+from utils.cart import SESSION_KEY, CartService
+
+
+@pytest.fixture
+def shop(app):
+    user = User(name='Buyer', email='buyer@example.com', password='x')
+    products = [Product(title=f'Item {i}', price=price, active=True) for i, price in enumerate((2.5, 10.0, 4.0))]
+    db.session.add_all([user, *products])
+    db.session.commit()
+    return user.id, [p.id for p in products]
+
+
+@pytest.fixture
+def buyer(client, shop):
+    with client.session_transaction() as s:
+        s['user_id'] = shop[0]
+        s['user_role'] = 'user'
+    return client
+
+
+def test_add_upserts_one_line(app, shop):
+    user_id, (first, second, _) = shop
+    cart = CartService(user_id)
+
+    assert cart.add(first, 2) == 2
+    assert cart.add(first, 3) == 5
+    cart.add(second, 1)
+    db.session.commit()
+
+    assert CartItem.query.filter_by(user_id=user_id, product_id=first).one().quantity == 5
+    summary = CartService(user_id).summary()
+    assert (summary.count, summary.total) == (6, 22.5)
+
+
+def test_inactive_products_are_not_counted(app, shop):
+    user_id, (first, second, _) = shop
+    cart = CartService(user_id)
+    cart.add(first, 1)
+    cart.add(second, 1)
+    db.session.get(Product, second).active = False
+    db.session.commit()
+
+    lines = CartService(user_id).lines()
+    assert [line.product.id for line in lines] == [first]
+
+
+def test_ajax_add_updates_the_session_badge(buyer, shop):
+    _, (first, _, _) = shop
+    response = buyer.post(f'/shop/add-to-cart/{first}/ajax', json={'quantity': 1})
+    assert response.get_json()['cart_count'] == 1
+    response = buyer.post(f'/shop/add-to-cart/{first}/ajax', json={'quantity': 2})
+    assert response.get_json()['cart_count'] == 3
+    assert CartItem.query.count() == 1
+    with buyer.session_transaction() as s:
+        assert s[SESSION_KEY]['count'] == 3
+
+
+def test_apply_changes_updates_and_removes(app, shop):
+    user_id, (first, second, third) = shop
+    cart = CartService(user_id)
+    cart.add(first, 1)
+    cart.add(second, 1)
+    db.session.commit()
+
+    # third is not in the cart and is ignored
+    cart.apply_changes({first: 4, second: 0, third: 2})
+    db.session.commit()
+
+    assert {(i.product_id, i.quantity) for i in CartItem.query.filter_by(user_id=user_id)} == {(first, 4)}
+
+
+def test_batch_patch_endpoint(buyer, shop):
+    _, (first, second, _) = shop
+    buyer.post(f'/shop/add-to-cart/{first}/ajax', json={'quantity': 1})
+    buyer.post(f'/shop/add-to-cart/{second}/ajax', json={'quantity': 1})
+
+    response = buyer.patch('/shop/cart', json={'items': [{'product_id': first, 'quantity': 3},
+                                                         {'product_id': second, 'quantity': 0}]})
+
+    body = response.get_json()
+    assert response.status_code == 200 and body['success']
+    assert body['lines'] == [{'product_id': first, 'quantity': 3, 'subtotal': 7.5}]
+    assert (body['cart_count'], body['total']) == (3, 7.5)
+    with buyer.session_transaction() as s:
+        assert s[SESSION_KEY]['count'] == 3
+
+
+@pytest.mark.parametrize('payload', [{'items': 'nope'}, [{'product_id': 1}], [{'product_id': 'x', 'quantity': 1}]])
+def test_batch_patch_rejects_bad_payloads(buyer, payload):
+    response = buyer.patch('/shop/cart', json=payload)
+    assert response.status_code == 400
+    assert response.get_json()['success'] is False
+
+
+def test_batch_patch_requires_login(client, shop):
+    response = client.patch('/shop/cart', json=[])
+    assert response.status_code in (302, 401)
+    assert CartItem.query.count() == 0
@@ -0,0 +1,113 @@
+"""Tests for listing expiry (utils/expiry.py, flask products expire)."""
+from datetime import datetime, timedelta
+
+from sqlalchemy import select
+
+from db import db
+from models.cart_item import CartItem
+from models.category import Category
+from models.product import Product
+from models.product_facet import ProductFacet
+from models.product_related import ProductRelated
+from models.user import User
+from utils.expiry import expire_products
+from utils.facets import rebuild_facets
+from utils.related import rebuild_all_related
+
+NOW = datetime.utcnow()
+PAST = NOW - timedelta(days=1)
+
+
+def _catalog(expired=3, live=3):
+    seeds = Category(name='Seeds')
+    buyer = User(name='Buyer', email='buyer@example.com', password='x')
+    db.session.add_all([seeds, buyer])
+    db.session.flush()
+    old = [Product(title=f'Old {i}', price=i + 1, category_id=seeds.id, expires_at=PAST) for i in range(expired)]
+    new = [Product(title=f'New {i}', price=i + 1, category_id=seeds.id) for i in range(live)]
+    db.session.add_all(old + new)
+    db.session.flush()
+    db.session.add_all([CartItem(user_id=buyer.id, product_id=p.id, quantity=1) for p in old[:1] + new[:1]])
+    db.session.commit()
+    return [p.id for p in old], [p.id for p in new]
+
+
+def _facet_total():
+    with db.engine.begin() as conn:
+        return rebuild_facets(conn)
+
+
+def test_new_products_get_an_expiry(app):
+    product = Product(title='Spade', price=9)
+    db.session.add(product)
+    db.session.commit()
+    lifetime = product.expires_at - product.created_at
+    assert abs(lifetime - timedelta(days=app.config.get('PRODUCT_MAX_DAYS', 30))) < timedelta(seconds=1)
+
+
+def test_deactivate_in_batches(app):
+    old, new = _catalog()
+
+    dry = expire_products(dry_run=True)
+    assert (dry.matched, dry.processed) == (3, 0)
+
+    result = expire_products(batch_size=2)
+
+    assert (result.matched, result.processed, result.batches, result.cart_lines) == (3, 3, 2, 1)
+    assert {p.id for p in Product.query.filter_by(active=False)} == set(old)
+    assert [i.product_id for i in CartItem.query] == [new[0]]
+    assert expire_products().matched == 0
+
+
+def test_delete_refreshes_neighbours_in_process(app):
+    old, new = _catalog()
+    rebuild_all_related()
+    listed_old = set(db.session.scalars(
+        select(ProductRelated.product_id).where(ProductRelated.related_id.in_(old))))
+
+    result = expire_products(delete=True, batch_size=2)
+
+    assert result.processed == 3 and result.related >= len(listed_old - set(old)) > 0
+    assert Product.query.count() == 3
+    referenced = set(db.session.scalars(select(ProductRelated.related_id)))
+    assert referenced and not referenced & set(old)
+    assert set(db.session.scalars(select(ProductRelated.product_id))) == set(new)
+
+
+def test_facets_follow_expiry(app):
+    _catalog()
+    expire_products(batch_size=2)
+    counted = sum(f.count for f in ProductFacet.query)
+    assert counted == _facet_total() == 3
+
+
+def test_reactivation_renews_the_expiry(app):
+    old, _ = _catalog(expired=1, live=0)
+    expire_products()
+    product = db.session.get(Product, old[0])
+    assert product.active is False
+
+    product.active = True
+    db.session.commit()
+
+    assert product.expires_at > datetime.utcnow() + timedelta(days=1)
+    assert expire_products().matched == 0
+
+
+def test_other_edits_keep_the_expiry(app):
+    old, _ = _catalog(expired=1, live=0)
+    product = db.session.get(Product, old[0])
+    product.title = 'Renamed'
+    db.session.commit()
+    assert product.expires_at == PAST
+
+
+def test_admin_cleanup_removes_expired_listings(app, client):
+    _, new = _catalog(expired=2, live=1)
+    with client.session_transaction() as s:
+        s['user_id'], s['user_role'] = 1, 'admin'
+
+    response = client.post('/admin/products/cleanup', follow_redirects=True)
+
+    assert 'Removed 2 expired products.' in response.get_data(as_text=True)
+    assert {p.id for p in Product.query} == set(new)
@@ -0,0 +1,108 @@
+"""Tests for the marketplace facet counts (utils/facets.py)."""
+import pytest
+
+from db import db
+from models.category import Category, SubCategory
+from models.product import Product
+from models.product_facet import ProductFacet
+from utils.facets import PRICE_BUCKETS, facet_counts, price_bucket, price_bucket_filter, rebuild_facets
+
+
+def _facets():
+    return sorted((f.category_id, f.subcategory_id, f.price_bucket, f.count)
+                  for f in ProductFacet.query.filter(ProductFacet.count > 0))
+
+
+def _assert_matches_rebuild():
+    counted = _facets()
+    with db.engine.begin() as conn:
+        rebuild_facets(conn)
+    assert _facets() == counted
+    return counted
+
+
+@pytest.fixture
+def catalog(app):
+    seeds, tools = Category(name='Seeds'), Category(name='Tools')
+    db.session.add_all([seeds, tools])
+    db.session.flush()
+    veg = SubCategory(name='Vegetable', category_id=seeds.id)
+    db.session.add(veg)
+    db.session.flush()
+    products = [
+        Product(title='Tomato', price=4, category_id=seeds.id, subcategory_id=veg.id, active=True),
+        Product(title='Wheat', price=30, category_id=seeds.id, active=True),
+        Product(title='Hoe', price=120, category_id=tools.id, active=True),
+        Product(title='Old rake', price=10, category_id=tools.id, active=False),
+        Product(title='Loose item', price=None, active=True),
+    ]
+    db.session.add_all(products)
+    db.session.commit()
+    return {'seeds': seeds.id, 'tools': tools.id, 'veg': veg.id,
+            'products': {p.title: p.id for p in products}}
+
+
+@pytest.mark.parametrize('price, bucket', [(None, 0), (0, 0), (24.99, 0), (25, 1), (99, 2), (500, 4)])
+def test_price_bucket(price, bucket):
+    assert price_bucket(price) == bucket
+
+
+def test_bucket_filter_agrees_with_price_bucket(catalog):
+    for bucket in range(len(PRICE_BUCKETS)):
+        matched = {p.title for p in Product.query.filter(price_bucket_filter(bucket))}
+        assert matched == {p.title for p in Product.query if price_bucket(p.price) == bucket}
+
+
+def test_insert_counts_active_products(catalog):
+    assert _assert_matches_rebuild() == [
+        (0, 0, 0, 1),
+        (catalog['seeds'], 0, 1, 1),
+        (catalog['seeds'], catalog['veg'], 0, 1),
+        (catalog['tools'], 0, 3, 1),
+    ]
+
+
+def test_updates_move_products_between_facets(catalog):
+    ids = catalog['products']
+    # Reload after the commit so the events see expired attributes
+    tomato = db.session.get(Product, ids['Tomato'])
+    tomato.price = 60
+    db.session.get(Product, ids['Wheat']).category_id = catalog['tools']
+    db.session.get(Product, ids['Hoe']).active = False
+    db.session.get(Product, ids['Old rake']).active = True
+    db.session.commit()
+    _assert_matches_rebuild()
+
+    # Several changes to one product in one flush
+    tomato.category_id, tomato.subcategory_id, tomato.price = catalog['tools'], None, 5
+    db.session.commit()
+    _assert_matches_rebuild()
+
+
+def test_delete_uncounts_the_product(catalog):
+    ids = catalog['products']
+    for title in ('Tomato', 'Old rake'):
+        db.session.delete(db.session.get(Product, ids[title]))
+    db.session.commit()
+    assert (catalog['seeds'], catalog['veg'], 0, 1) not in _assert_matches_rebuild()
+
+
+def test_rollback_keeps_counts(catalog):
+    before = _facets()
+    db.session.get(Product, catalog['products']['Hoe']).active = False
+    db.session.flush()
+    db.session.rollback()
+    assert _facets() == before
+
+
+def test_facet_counts_honour_the_other_filters(catalog):
+    facets = facet_counts(category_id=catalog['seeds'])
+    assert [(o.label, o.count, o.selected) for o in facets.categories] == [
+        ('Seeds', 2, True), ('Tools', 1, False)]
+    assert [(o.label, o.count) for o in facets.subcategories] == [('Vegetable', 1)]
+    assert [(o.value, o.count) for o in facets.prices] == [(0, 1), (1, 1)]
+
+    # A price filter narrows the category counts but not the price options
+    facets = facet_counts(bucket=3)
+    assert [(o.label, o.count) for o in facets.categories] == [('Tools', 1)]
+    assert sum(o.count for o in facets.prices) == 4
@@ -0,0 +1,116 @@
+"""Tests for upload reconciliation (utils/media.py, flask media reconcile)."""
+import os
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+from db import db
+from models.stored_file import StoredFile
+from models.upload_session import UploadSession
+from models.user import User
+from utils.media import reconcile_uploads
+
+DAY = 24 * 3600
+PICTURE = 'uploads/store/ab/' + 'ab' * 32 + '.jpg'
+ORPHAN = 'uploads/store/cd/' + 'cd' * 32 + '.jpg'
+
+
+def _write(folder, path, age=0):
+    full = os.path.join(folder, path)
+    os.makedirs(os.path.dirname(full), exist_ok=True)
+    with open(full, 'wb') as f:
+        f.write(b'data')
+    if age:
+        stamp = time.time() - age
+        os.utime(full, (stamp, stamp))
+    return full
+
+
+@pytest.fixture
+def uploads(app):
+    """A referenced picture with a wrong refcount, its rendition, an old
+    orphan, an old and a fresh orphan avatar, and an idle upload session
+    next to staged parts: its own, a stray old chunk and a fresh one."""
+    user = User(name='Grower', email='grower@example.com', password='x', picture=PICTURE)
+    db.session.add(user)
+    db.session.flush()
+    db.session.add(StoredFile(sha256='ab' * 32, path=PICTURE, size=4, refcount=3))
+    db.session.add(StoredFile(sha256='cd' * 32, path=ORPHAN, size=4, refcount=1))
+    db.session.add(UploadSession(id='a' * 32, user_id=user.id, filename='clip.mp4', ext='.mp4', size=10,
+                                 updated_at=datetime.utcnow() - timedelta(days=3)))
+    db.session.commit()
+    static, incoming = app.static_folder, app.config['UPLOAD_INCOMING_FOLDER']
+    return {
+        'picture': _write(static, PICTURE, age=3 * DAY),
+        'rendition': _write(static, PICTURE.replace('.jpg', '.card.webp'), age=3 * DAY),
+        'orphan': _write(static, ORPHAN, age=3 * DAY),
+        'old': _write(static, 'uploads/avatars/old.png', age=3 * DAY),
+        'fresh': _write(static, 'uploads/avatars/new.png'),
+        'part': _write(incoming, 'a' * 32 + '.part'),
+        'stray': _write(incoming, 'b' * 32 + '.0.123.part', age=3 * DAY),
+        'chunk': _write(incoming, 'c' * 32 + '.0.123.part'),
+    }
+
+
+def test_dry_run_reports_without_writing(app, uploads):
+    report = reconcile_uploads(delete=False)
+
+    # Staged parts live outside static/ and never show up in the scan
+    assert report.scanned == 5
+    assert report.missing == []
+    assert sorted(p for p, _, _ in report.orphans) == sorted([
+        ORPHAN, 'uploads/avatars/old.png', 'uploads/avatars/new.png'])
+    assert len(report.expired) == 2
+    assert report.refcounts_fixed == 1
+    assert report.stale_uploads == 1
+    assert report.deleted == []
+
+    db.session.expire_all()
+    assert StoredFile.query.filter_by(path=PICTURE).one().refcount == 3
+    assert StoredFile.query.filter_by(path=ORPHAN).count() == 1
+    assert UploadSession.query.count() == 1
+    assert all(os.path.exists(path) for path in uploads.values())
+
+
+def test_delete_applies_everything(app, uploads):
+    report = reconcile_uploads(delete=True)
+
+    assert sorted(report.deleted) == sorted([ORPHAN, 'uploads/avatars/old.png'])
+    assert report.refcounts_fixed == 1
+
+    db.session.expire_all()
+    assert StoredFile.query.filter_by(path=PICTURE).one().refcount == 1
+    assert StoredFile.query.filter_by(path=ORPHAN).count() == 0
+    assert UploadSession.query.count() == 0
+    assert not any(os.path.exists(uploads[key]) for key in ('orphan', 'old', 'part', 'stray'))
+    # Referenced files, their renditions and anything inside the grace period stay
+    assert all(os.path.exists(uploads[key]) for key in ('picture', 'rendition', 'fresh', 'chunk'))
+
+
+def test_delete_respects_limit(app, uploads):
+    report = reconcile_uploads(delete=True, limit=1)
+    assert len(report.deleted) == 1
+    assert len(report.expired) == 2
+
+
+def test_missing_files_are_reported(app, uploads):
+    os.remove(uploads['picture'])
+    report = reconcile_uploads()
+    (path, owners), = report.missing
+    assert path == PICTURE
+    assert owners[0][0] == User.__tablename__
+
+
+def test_command_output(app, uploads):
+    runner = app.test_cli_runner()
+
+    dry = runner.invoke(args=['media', 'reconcile'])
+    assert dry.exit_code == 0, dry.output
+    assert 'Would correct 1 stored file reference counts.' in dry.output
+    assert 'Found 1 chunked uploads' in dry.output
+    assert 'Dry run: pass --delete' in dry.output
+
+    applied = runner.invoke(args=['media', 'reconcile', '--delete'])
+    assert 'Corrected 1 stored file reference counts.' in applied.output
+    assert 'Deleted 2 orphaned files' in applied.output
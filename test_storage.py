@@ -0,0 +1,109 @@
+"""Tests for content-addressed upload storage (utils/storage.py)."""
+import io
+import os
+
+from werkzeug.datastructures import FileStorage
+
+from db import db
+from models.stored_file import StoredFile
+from utils.storage import STORE_PREFIX, delete_if_unused, release_upload, release_uploads, save_upload
+
+
+def _upload(data, name='photo.jpg'):
+    return FileStorage(stream=io.BytesIO(data), filename=name)
+
+
+def _exists(app, path):
+    return os.path.exists(os.path.join(app.static_folder, path))
+
+
+def test_same_content_is_stored_once(app):
+    first = save_upload(_upload(b'same bytes'), '.jpg')
+    second = save_upload(_upload(b'same bytes', 'copy.jpg'), '.jpg')
+    other = save_upload(_upload(b'other bytes'), '.jpg')
+    db.session.commit()
+
+    assert first == second != other
+    assert first.startswith(STORE_PREFIX + '/')
+    assert StoredFile.query.filter_by(path=first).one().refcount == 2
+    assert StoredFile.query.filter_by(path=other).one().refcount == 1
+    # No temp files are left next to the stored ones
+    folder = os.path.join(app.static_folder, os.path.dirname(first))
+    assert not [name for name in os.listdir(folder) if name.endswith('.part')]
+
+
+def test_file_is_deleted_after_commit_of_last_release(app):
+    path = save_upload(_upload(b'shared'), '.png')
+    save_upload(_upload(b'shared'), '.png')
+    db.session.commit()
+
+    release_upload(path)
+    db.session.commit()
+    assert _exists(app, path)
+    assert StoredFile.query.filter_by(path=path).one().refcount == 1
+
+    release_upload(path)
+    assert _exists(app, path)  # not before the commit
+    db.session.commit()
+    assert not _exists(app, path)
+    assert StoredFile.query.filter_by(path=path).count() == 0
+
+
+def test_new_reference_restarts_the_grace_period(app):
+    path = save_upload(_upload(b'again'), '.jpg')
+    db.session.commit()
+    full = os.path.join(app.static_folder, path)
+    os.utime(full, (1, 1))
+
+    save_upload(_upload(b'again'), '.jpg')
+    assert os.stat(full).st_mtime > 1
+
+
+def test_delete_rechecks_the_refcount(app):
+    # The file was queued for deletion, but the same content was uploaded
+    # again before the commit hook ran
+    path = save_upload(_upload(b'raced'), '.jpg')
+    db.session.commit()
+
+    assert delete_if_unused(path) is False
+    assert _exists(app, path)
+    assert StoredFile.query.filter_by(path=path).one().refcount == 1
+
+
+def test_rollback_keeps_the_file(app):
+    path = save_upload(_upload(b'keep me'), '.jpg')
+    db.session.commit()
+
+    release_upload(path)
+    db.session.rollback()
+    db.session.commit()
+
+    assert _exists(app, path)
+    assert StoredFile.query.filter_by(path=path).one().refcount == 1
+
+
+def test_bulk_release(app):
+    shared = save_upload(_upload(b'a'), '.jpg')
+    save_upload(_upload(b'a'), '.jpg')
+    single = save_upload(_upload(b'b'), '.jpg')
+    db.session.commit()
+
+    release_uploads([shared, single, None, 'https://example.com/x.jpg'])
+    db.session.commit()
+
+    assert StoredFile.query.filter_by(path=shared).one().refcount == 1
+    assert _exists(app, shared)
+    assert StoredFile.query.filter_by(path=single).count() == 0
+    assert not _exists(app, single)
+
+
+def test_legacy_paths_are_deleted_outright(app):
+    legacy = 'uploads/avatars/0123abcd.jpg'
+    full = os.path.join(app.static_folder, legacy)
+    os.makedirs(os.path.dirname(full))
+    with open(full, 'wb') as f:
+        f.write(b'old')
+
+    release_upload(legacy)
+    db.session.commit()
+    assert not os.path.exists(full)
@@ -0,0 +1,153 @@
+"""Tests for resumable chunked uploads (utils/uploads.py and the /blog/uploads API)."""
+import hashlib
+import io
+import os
+
+import pytest
+
+from db import db
+from models.blog_media import BlogMedia
+from models.post import Post
+from models.upload_session import UploadSession
+from models.user import User
+from utils.uploads import UploadError, append_chunk, part_path
+
+DATA = b'0123456789abcdefghij'  # 20 bytes, sent in chunks of 8
+
+
+def _sha(chunk):
+    return hashlib.sha256(chunk).hexdigest()
+
+
+@pytest.fixture
+def author(app, client, monkeypatch):
+    monkeypatch.setitem(app.config, 'UPLOAD_CHUNK_BYTES', 8)
+    monkeypatch.setitem(app.config, 'UPLOAD_MAX_BYTES', 64)
+    user = User(name='Author', email='author@example.com', password='x')
+    db.session.add(user)
+    db.session.flush()
+    post = Post(title='Harvest', body='Video below', author_id=user.id)
+    db.session.add(post)
+    db.session.commit()
+    with client.session_transaction() as s:
+        s['user_id'] = user.id
+    return {'user_id': user.id, 'post_id': post.id}
+
+
+def _start(client, size=len(DATA), filename='harvest.mp4'):
+    return client.post('/blog/uploads', json={'filename': filename, 'size': size})
+
+
+def _send(client, upload_id, offset, chunk, checksum=True):
+    headers = {'Upload-Offset': str(offset)}
+    if checksum:
+        headers['X-Chunk-SHA256'] = _sha(chunk)
+    return client.patch(f'/blog/uploads/{upload_id}', data=chunk, headers=headers)
+
+
+def test_upload_in_chunks_and_attach(app, client, author):
+    started = _start(client)
+    assert started.status_code == 201
+    upload_id = started.get_json()['id']
+    assert started.get_json()['offset'] == 0 and started.get_json()['chunk_size'] == 8
+    # Staged outside static/, so a partial file is never served
+    assert os.path.exists(part_path(upload_id))
+    assert not part_path(upload_id).startswith(app.static_folder)
+
+    for offset in range(0, len(DATA), 8):
+        response = _send(client, upload_id, offset, DATA[offset:offset + 8])
+        assert response.status_code == 200
+        assert response.get_json()['offset'] == min(offset + 8, len(DATA))
+
+    done = client.post(f'/blog/uploads/{upload_id}/complete', json={'post_id': author['post_id']})
+    assert done.status_code == 201
+    body = done.get_json()
+    media = db.session.get(BlogMedia, body['media_id'])
+    assert media.post_id == author['post_id'] and media.media_type == 'video'
+    assert body['url'] == '/media/' + media.file_path
+    with open(os.path.join(app.static_folder, media.file_path), 'rb') as f:
+        assert f.read() == DATA
+    assert db.session.get(UploadSession, upload_id) is None
+    assert not os.path.exists(part_path(upload_id))
+
+
+def test_resume_after_a_retried_chunk(client, author):
+    upload_id = _start(client).get_json()['id']
+    assert _send(client, upload_id, 0, DATA[:8]).status_code == 200
+
+    # The client lost the response and resends the same chunk
+    duplicate = _send(client, upload_id, 0, DATA[:8])
+    assert duplicate.status_code == 409
+    assert duplicate.get_json()['offset'] == 8
+
+    assert client.get(f'/blog/uploads/{upload_id}').get_json()['offset'] == 8
+    assert _send(client, upload_id, 8, DATA[8:16]).status_code == 200
+
+
+def test_concurrent_duplicate_loses_the_range_claim(app, author):
+    upload = UploadSession(id='c' * 32, user_id=author['user_id'], filename='a.mp4', ext='.mp4',
+                           size=len(DATA), received=0)
+    db.session.add(upload)
+    db.session.commit()
+    os.makedirs(os.path.dirname(part_path(upload.id)), exist_ok=True)
+    open(part_path(upload.id), 'wb').close()
+    assert append_chunk(upload, 0, io.BytesIO(DATA[:8]), 8, _sha(DATA[:8])) == 8
+    db.session.commit()
+
+    # A second worker loaded the session before the first chunk landed: its
+    # copy still says offset 0, so only the conditional UPDATE can stop it
+    stale = UploadSession(id=upload.id, user_id=upload.user_id, filename=upload.filename,
+                          ext=upload.ext, size=upload.size, received=0)
+
+    with pytest.raises(UploadError) as error:
+        append_chunk(stale, 0, io.BytesIO(b'XXXXXXXX'), 8, _sha(b'XXXXXXXX'))
+    assert error.value.status == 409
+    db.session.rollback()
+    with open(part_path(upload.id), 'rb') as f:
+        assert f.read() == DATA[:8]
+
+
+def test_bad_or_missing_checksum_is_rejected(client, author):
+    upload_id = _start(client).get_json()['id']
+    response = client.patch(f'/blog/uploads/{upload_id}', data=DATA[:8],
+                            headers={'Upload-Offset': '0', 'X-Chunk-SHA256': '0' * 64})
+    assert response.status_code == 422
+    assert client.get(f'/blog/uploads/{upload_id}').get_json()['offset'] == 0
+    # A chunk without a checksum is refused too
+    assert _send(client, upload_id, 0, DATA[:8], checksum=False).status_code == 400
+    assert client.get(f'/blog/uploads/{upload_id}').get_json()['offset'] == 0
+    assert _send(client, upload_id, 0, DATA[:8]).status_code == 200
+
+
+@pytest.mark.parametrize('size, status', [(65, 413), (0, 400), ('20', 400)])
+def test_start_validates_size(client, author, size, status):
+    assert _start(client, size=size).status_code == status
+
+
+def test_chunk_limits(client, author):
+    upload_id = _start(client).get_json()['id']
+    assert _send(client, upload_id, 0, DATA[:9]).status_code == 413
+    assert client.patch(f'/blog/uploads/{upload_id}', data=b'x').status_code == 400
+    _send(client, upload_id, 0, DATA[:8])
+    _send(client, upload_id, 8, DATA[8:16])
+    assert _send(client, upload_id, 16, b'tooolong').status_code == 400
+    incomplete = client.post(f'/blog/uploads/{upload_id}/complete', json={'post_id': author['post_id']})
+    assert incomplete.status_code == 409 and incomplete.get_json()['offset'] == 16
+
+
+def test_sessions_are_private(app, client, author):
+    upload_id = _start(client).get_json()['id']
+    assert _start(client, filename='script.exe').status_code == 400
+
+    other = app.test_client()
+    assert other.post('/blog/uploads', json={'filename': 'a.mp4', 'size': 4}).status_code == 401
+    stranger = User(name='Other', email='other@example.com', password='x')
+    db.session.add(stranger)
+    db.session.commit()
+    with other.session_transaction() as s:
+        s['user_id'] = stranger.id
+    assert other.get(f'/blog/uploads/{upload_id}').status_code == 404
+    assert _send(other, upload_id, 0, DATA[:8]).status_code == 404
+
+    assert client.delete(f'/blog/uploads/{upload_id}').status_code == 200
+    assert not os.path.exists(part_path(upload_id))
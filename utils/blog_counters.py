@@ -0,0 +1,63 @@
+"""
+Denormalised post counters: post.like_count and post.comment_count.
+
+Like and BlogComment insert/delete events bump the owning post with a
+single `UPDATE post SET x = x +/- 1` inside the same flush, so the counter
+commits or rolls back together with the row and a like toggle never has
+to count the likes. Bulk deletes skip these events;
+`flask blog reconcile-counters` recomputes both columns from the source
+tables.
+"""
+from sqlalchemy import event, func, or_, select
+
+from models.blog_comment import BlogComment
+from models.like import Like
+from models.post import Post
+
+
+def bump_counter(conn, post_id, column, delta):
+    posts = Post.__table__
+    counter = posts.c[column]
+    conn.execute(
+        posts.update()
+        .where(posts.c.id == post_id)
+        # A counter tick isn't an edit: keep updated_at as it was
+        .values({column: counter + delta, 'updated_at': posts.c.updated_at})
+    )
+
+
+@event.listens_for(Like, 'after_insert')
+def _like_added(mapper, connection, target):
+    if target.post_id and target.comment_id is None:
+        bump_counter(connection, target.post_id, 'like_count', 1)
+
+
+@event.listens_for(Like, 'after_delete')
+def _like_removed(mapper, connection, target):
+    if target.post_id and target.comment_id is None:
+        bump_counter(connection, target.post_id, 'like_count', -1)
+
+
+@event.listens_for(BlogComment, 'after_insert')
+def _comment_added(mapper, connection, target):
+    bump_counter(connection, target.post_id, 'comment_count', 1)
+
+
+@event.listens_for(BlogComment, 'after_delete')
+def _comment_removed(mapper, connection, target):
+    bump_counter(connection, target.post_id, 'comment_count', -1)
+
+
+def reconcile_counters(conn):
+    """Recompute both counters for every post; returns the number of posts fixed."""
+    posts = Post.__table__
+    likes = (select(func.count()).select_from(Like)
+             .where(Like.post_id == posts.c.id, Like.comment_id.is_(None)).scalar_subquery())
+    comments = (select(func.count()).select_from(BlogComment)
+                .where(BlogComment.post_id == posts.c.id).scalar_subquery())
+    return conn.execute(
+        posts.update()
+        .where(or_(posts.c.like_count != likes, posts.c.comment_count != comments))
+        .values(like_count=likes, comment_count=comments, updated_at=posts.c.updated_at)
+    ).rowcount
+
@@ -0,0 +1,39 @@
+"""
+Denormalised blog cover images.
+
+post.cover_media_path holds the file_path of the post's first image
+(lowest blog_media id), so listings can show a cover without loading any
+media rows. BlogMedia insert/update/delete events recompute it with one
+UPDATE in the same flush; refresh_covers() recomputes it in bulk.
+"""
+from sqlalchemy import event, select
+
+from models.blog_media import BlogMedia
+from models.post import Post
+
+
+def _first_image(post_id_column):
+    return (select(BlogMedia.file_path)
+            .where(BlogMedia.post_id == post_id_column, BlogMedia.media_type == 'image')
+            .order_by(BlogMedia.id)
+            .limit(1)
+            .scalar_subquery())
+
+
+def refresh_covers(conn, post_ids=None):
+    """Recompute cover_media_path for the given posts, or for every post."""
+    posts = Post.__table__
+    stmt = posts.update().values(cover_media_path=_first_image(posts.c.id))
+    if post_ids is not None:
+        post_ids = list(post_ids)
+        if not post_ids:
+            return 0
+        stmt = stmt.where(posts.c.id.in_(post_ids))
+    return conn.execute(stmt).rowcount
+
+
+@event.listens_for(BlogMedia, 'after_insert')
+@event.listens_for(BlogMedia, 'after_update')
+@event.listens_for(BlogMedia, 'after_delete')
+def _media_changed(mapper, connection, target):
+    refresh_covers(connection, [target.post_id])
@@ -0,0 +1,154 @@
+"""
+Normalised blog tags.
+
+post.tags keeps the comma-separated string the author typed; the tag and
+post_tags tables hold the parsed, lower-cased names so filtering by tag is
+an exact, indexed join instead of a substring scan. Post insert/update
+events rewrite a post's post_tags rows in the same flush, and deleting a
+post removes them. `flask blog backfill-tags` rebuilds the whole index
+from the strings.
+
+tag_cloud() serves the most used tags from an in-process cache that is
+dropped whenever a commit touched post_tags.
+"""
+import threading
+import time
+
+from sqlalchemy import event, func, inspect, select
+from sqlalchemy.dialects import postgresql, sqlite
+
+from db import db
+from models.post import Post
+from models.tag import Tag, post_tags
+
+TAG_MAX = Tag.name.type.length
+TAG_CLOUD_TTL = 300
+TAG_CLOUD_SIZE = 30
+
+_lock = threading.Lock()
+_cloud = {'tags': None, 'built_at': 0.0}
+
+
+def normalize_tag(name):
+    return ' '.join((name or '').split()).lower()[:TAG_MAX]
+
+
+def parse_tags(raw):
+    """'Organic, IoT,organic ' -> ['organic', 'iot'] (order kept, no duplicates)."""
+    names = []
+    for part in (raw or '').split(','):
+        name = normalize_tag(part)
+        if name and name not in names:
+            names.append(name)
+    return names
+
+
+def _tag_ids(conn, names):
+    """{name: id}, creating the tags that don't exist yet."""
+    if not names:
+        return {}
+    dialect = postgresql if conn.dialect.name == 'postgresql' else sqlite
+    conn.execute(dialect.insert(Tag).on_conflict_do_nothing(index_elements=[Tag.name]),
+                 [{'name': name} for name in names])
+    return dict(conn.execute(select(Tag.name, Tag.id).where(Tag.name.in_(names))).all())
+
+
+def set_post_tags(conn, post_ids_to_tags):
+    """Replace the post_tags rows of each {post_id: raw tag string}."""
+    if not post_ids_to_tags:
+        return 0
+    parsed = {post_id: parse_tags(raw) for post_id, raw in post_ids_to_tags.items()}
+    ids = _tag_ids(conn, sorted({name for names in parsed.values() for name in names}))
+    conn.execute(post_tags.delete().where(post_tags.c.post_id.in_(list(parsed))))
+    rows = [{'post_id': post_id, 'tag_id': ids[name]}
+            for post_id, names in parsed.items() for name in names]
+    if rows:
+        conn.execute(post_tags.insert(), rows)
+    return len(rows)
+
+
+def backfill_post_tags(conn, batch_size=500):
+    """Rebuild post_tags from every post's tag string; returns (posts, links)."""
+    posts = links = 0
+    last_id = 0
+    while True:
+        batch = conn.execute(
+            select(Post.id, Post.tags).where(Post.id > last_id).order_by(Post.id).limit(batch_size)
+        ).all()
+        if not batch:
+            break
+        last_id = batch[-1][0]
+        links += set_post_tags(conn, dict(batch))
+        posts += len(batch)
+    # Tags no post uses any more
+    conn.execute(Tag.__table__.delete().where(~Tag.id.in_(select(post_tags.c.tag_id))))
+    invalidate_tag_cloud()
+    return posts, links
+
+
+def tag_filter(query, name):
+    """Restrict a Post query to posts carrying tag `name` (exact, case-insensitive)."""
+    return (query.join(post_tags, post_tags.c.post_id == Post.id)
+            .join(Tag, Tag.id == post_tags.c.tag_id)
+            .filter(Tag.name == normalize_tag(name)))
+
+
+# --------------------------
+# Tag cloud
+# --------------------------
+def invalidate_tag_cloud():
+    with _lock:
+        _cloud['tags'] = None
+
+
+def tag_cloud():
+    """[(name, post count)] for the most used tags, most used first."""
+    with _lock:
+        if _cloud['tags'] is None or time.monotonic() - _cloud['built_at'] > TAG_CLOUD_TTL:
+            uses = func.count(post_tags.c.post_id)
+            _cloud['tags'] = [tuple(row) for row in db.session.execute(
+                select(Tag.name, uses)
+                .join(post_tags, post_tags.c.tag_id == Tag.id)
+                .group_by(Tag.id)
+                .order_by(uses.desc(), Tag.name)
+                .limit(TAG_CLOUD_SIZE))]
+            _cloud['built_at'] = time.monotonic()
+        return _cloud['tags']
+
+
+# --------------------------
+# Keeping post_tags in sync
+# --------------------------
+def _mark_changed(target):
+    inspect(target).session.info['tags_changed'] = True
+
+
+@event.listens_for(Post, 'after_insert')
+def _post_inserted(mapper, connection, target):
+    if target.tags:
+        set_post_tags(connection, {target.id: target.tags})
+        _mark_changed(target)
+
+
+@event.listens_for(Post, 'after_update')
+def _post_updated(mapper, connection, target):
+    if inspect(target).attrs.tags.history.has_changes():
+        set_post_tags(connection, {target.id: target.tags})
+        _mark_changed(target)
+
+
+@event.listens_for(Post, 'before_delete')
+def _post_deleted(mapper, connection, target):
+    connection.execute(post_tags.delete().where(post_tags.c.post_id == target.id))
+    _mark_changed(target)
+
+
+@event.listens_for(db.session, 'after_commit')
+def _refresh_cloud(session):
+    if session.info.pop('tags_changed', False):
+        invalidate_tag_cloud()
+
+
+@event.listens_for(db.session, 'after_soft_rollback')
+def _discard_changes(session, previous_transaction):
+    session.info.pop('tags_changed', None)
@@ -0,0 +1,162 @@
+"""
+Database-backed shopping cart.
+
+CartService loads a user's cart with one joined query and computes the
+item count and total in SQL. Results are memoised on flask.g, so a request
+that renders the cart and its summary costs exactly one query.
+
+The navbar badge reads a copy of the summary kept in the session
+(SESSION_KEY), refreshed by every cart mutation, at login and whenever the
+cart page is viewed, so ordinary page renders never query the cart.
+"""
+from datetime import datetime
+
+from flask import g, session
+from sqlalchemy import bindparam, func
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import contains_eager
+
+from db import db
+from models.cart_item import CartItem
+from models.product import Product
+
+SESSION_KEY = 'cart_summary'
+
+
+class CartLine:
+    def __init__(self, item, quantity, subtotal):
+        self.item = item
+        self.product = item.product
+        self.quantity = quantity
+        self.subtotal = subtotal
+
+
+class CartSummary:
+    def __init__(self, count=0, total=0.0):
+        self.count = int(count or 0)
+        self.total = float(total or 0)
+
+
+class CartService:
+    """Cart operations for a single user.
+
+    Only lines whose product is still active are listed or counted.
+    """
+
+    def __init__(self, user_id):
+        self.user_id = user_id
+        self._lines = None
+        self._summary = None
+
+    @classmethod
+    def for_current_user(cls):
+        """Per-request instance for the logged-in user, or None if anonymous."""
+        user_id = session.get('user_id')
+        if not user_id:
+            return None
+        cached = g.get('cart_service')
+        if cached is None or cached.user_id != user_id:
+            cached = g.cart_service = cls(user_id)
+        return cached
+
+    def _line_total(self):
+        return CartItem.quantity * func.coalesce(Product.price, 0)
+
+    def lines(self):
+        """Cart lines with products eagerly loaded, plus the summary, in one query."""
+        if self._lines is None:
+            rows = (CartItem.query
+                    .join(CartItem.product)
+                    .options(contains_eager(CartItem.product))
+                    .filter(CartItem.user_id == self.user_id, Product.active == True)
+                    .add_columns(self._line_total().label('subtotal'),
+                                 func.sum(CartItem.quantity).over().label('cart_count'),
+                                 func.sum(self._line_total()).over().label('cart_total'))
+                    .order_by(CartItem.added_at, CartItem.id)
+                    .all())
+            self._lines = [CartLine(item, item.quantity, subtotal) for item, subtotal, _, _ in rows]
+            if rows:
+                self._summary = CartSummary(rows[0].cart_count, rows[0].cart_total)
+            else:
+                self._summary = CartSummary()
+        return self._lines
+
+    def summary(self):
+        """Item count and total; a single aggregate query unless lines() already ran."""
+        if self._summary is None:
+            count, total = (db.session.query(func.sum(CartItem.quantity), func.sum(self._line_total()))
+                            .join(Product, Product.id == CartItem.product_id)
+                            .filter(CartItem.user_id == self.user_id, Product.active == True)
+                            .one())
+            self._summary = CartSummary(count, total)
+        return self._summary
+
+    def add(self, product_id, quantity):
+        """Add `quantity` of a product in a single atomic upsert.
+
+        Relies on the unique (user_id, product_id) index, so concurrent
+        double-clicks increment one row instead of inserting duplicates.
+        Returns the line's new quantity; the caller commits.
+        """
+        dialect = postgresql if db.engine.dialect.name == 'postgresql' else sqlite
+        stmt = dialect.insert(CartItem).values(
+            user_id=self.user_id,
+            product_id=product_id,
+            quantity=quantity,
+            added_at=datetime.utcnow(),
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[CartItem.user_id, CartItem.product_id],
+            set_={'quantity': CartItem.quantity + stmt.excluded.quantity},
+        ).returning(CartItem.quantity)
+        self.invalidate()
+        return db.session.execute(stmt).scalar_one()
+
+    def apply_changes(self, changes):
+        """Apply {product_id: quantity} edits with bulk statements.
+
+        Quantities <= 0 remove the line. Products not already in the cart
+        are ignored. One DELETE plus one executemany UPDATE; the caller
+        commits.
+        """
+        removals = [pid for pid, qty in changes.items() if qty <= 0]
+        updates = [{'b_product_id': pid, 'b_quantity': qty} for pid, qty in changes.items() if qty > 0]
+        table = CartItem.__table__
+        if removals:
+            db.session.execute(table.delete().where(
+                table.c.user_id == self.user_id, table.c.product_id.in_(removals)))
+        if updates:
+            db.session.execute(
+                table.update()
+                .where(table.c.user_id == self.user_id, table.c.product_id == bindparam('b_product_id'))
+                .values(quantity=bindparam('b_quantity')),
+                updates,
+            )
+        self.invalidate()
+
+    def invalidate(self):
+        """Forget memoised results after the cart was modified."""
+        self._lines = None
+        self._summary = None
+
+    def remember(self, bump=False):
+        """Copy the summary into the session for the navbar badge.
+
+        The version increases on every mutation (bump=True) or whenever
+        the cached count turns out to be stale.
+        """
+        summary = self.summary()
+        previous = session.get(SESSION_KEY) or {}
+        if bump or previous.get('count') != summary.count:
+            session[SESSION_KEY] = {'count': summary.count, 'version': previous.get('version', 0) + 1}
+        return summary
+
+    def changed(self):
+        """Call after committing a cart mutation; returns the fresh summary."""
+        self.invalidate()
+        return self.remember(bump=True)
+
+
+def cached_cart_count():
+    """Navbar badge count from the session; never touches the database."""
+    return (session.get(SESSION_KEY) or {}).get('count', 0)
@@ -0,0 +1,265 @@
+"""
+Bulk catalog import/export: `flask products import` / `flask products export`.
+
+Both directions stream, so memory stays flat however large the catalog:
+rows are read from the CSV/JSONL file one at a time, validated, and
+inserted `batch_size` at a time with one executemany INSERT and one
+commit per chunk. Category and subcategory names are resolved through a
+lookup loaded once up front. Export walks the table with yield_per.
+
+The inserts are Core statements, so the work the ORM events would do is
+done per chunk here: expires_at, the search index, facet counts and the
+related-products refresh, each chunk's neighbourhood committed right
+after the chunk itself.
+
+Columns (CSV header / JSONL keys); only title is required on import:
+
+    title, description, specifications, price, category, subcategory,
+    seller_email, image, active
+"""
+import csv
+import json
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, select
+
+from db import db
+from models.category import Category, SubCategory
+from models.product import Product
+from models.user import User
+from utils.expiry import max_days
+from utils.facets import adjust_facets_for
+from utils.related import refresh_related_in_batches
+from utils.search import fts_supported, index_products
+
+FIELDS = ('title', 'description', 'specifications', 'price', 'category', 'subcategory',
+          'seller_email', 'image', 'active')
+EXPORT_FIELDS = ('id',) + FIELDS + ('created_at', 'expires_at')
+FORMATS = ('csv', 'jsonl')
+TITLE_MAX = Product.title.type.length
+IMAGE_MAX = Product.image.type.length
+# Row errors kept for the report; the rest are only counted
+MAX_ERRORS = 50
+
+_TRUE = {'1', 'true', 'yes', 'y', 'on'}
+_FALSE = {'0', 'false', 'no', 'n', 'off'}
+
+
+class RowError(ValueError):
+    pass
+
+
+class ImportResult:
+    def __init__(self, dry_run=False):
+        self.read = 0
+        self.inserted = 0
+        self.rejected = 0
+        self.batches = 0
+        self.related = 0          # related-product lists recomputed
+        self.errors = []          # (line, message), first MAX_ERRORS only
+        self.dry_run = dry_run
+
+    def reject(self, line, message):
+        self.rejected += 1
+        if len(self.errors) < MAX_ERRORS:
+            self.errors.append((line, message))
+
+
+def format_for(filename, fmt=None):
+    """Explicit format, else guessed from the file extension (default csv)."""
+    if fmt:
+        return fmt
+    return 'jsonl' if filename.lower().endswith(('.jsonl', '.ndjson', '.json')) else 'csv'
+
+
+def read_rows(stream, fmt):
+    """Yield (line number, dict) pairs from a CSV or JSONL text stream."""
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+        return
+    for line_num, line in enumerate(stream, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            yield line_num, RowError(f'invalid JSON: {e}')
+            continue
+        yield line_num, row if isinstance(row, dict) else RowError('expected a JSON object')
+
+
+class _Lookups:
+    """Name -> id maps for categories, subcategories and sellers."""
+
+    def __init__(self):
+        self.categories = {name.strip().lower(): cid
+                           for cid, name in db.session.execute(select(Category.id, Category.name))}
+        self.subcategories = {(cid, name.strip().lower()): sid
+                              for sid, cid, name in db.session.execute(
+                                  select(SubCategory.id, SubCategory.category_id, SubCategory.name))}
+        self._sellers = {}
+
+    def seller_id(self, email):
+        if email not in self._sellers:
+            self._sellers[email] = db.session.scalar(select(User.id).where(func.lower(User.email) == email))
+        return self._sellers[email]
+
+
+def _text(row, key):
+    value = row.get(key)
+    if value is None:
+        return ''
+    return str(value).strip()
+
+
+def _parse_active(value):
+    if value is None or value == '':
+        return True
+    if isinstance(value, bool):
+        return value
+    value = str(value).strip().lower()
+    if value in _TRUE:
+        return True
+    if value in _FALSE:
+        return False
+    raise RowError(f'active must be true/false, got {value!r}')
+
+
+def _validate(row, lookups, seller_email, now, expires_at):
+    """One CSV/JSONL row -> product column values, or RowError."""
+    title = _text(row, 'title')
+    if not title:
+        raise RowError('title is required')
+    if len(title) > TITLE_MAX:
+        raise RowError(f'title longer than {TITLE_MAX} characters')
+
+    price = row.get('price')
+    try:
+        price = float(price) if price not in (None, '') else 0.0
+    except (TypeError, ValueError):
+        raise RowError(f'price is not a number: {price!r}')
+    if price < 0:
+        raise RowError('price must not be negative')
+
+    category_id = subcategory_id = None
+    category = _text(row, 'category')
+    if category:
+        category_id = lookups.categories.get(category.lower())
+        if category_id is None:
+            raise RowError(f'unknown category {category!r}')
+    subcategory = _text(row, 'subcategory')
+    if subcategory:
+        if category_id is None:
+            raise RowError('subcategory given without a category')
+        subcategory_id = lookups.subcategories.get((category_id, subcategory.lower()))
+        if subcategory_id is None:
+            raise RowError(f'unknown subcategory {subcategory!r} in {category!r}')
+
+    image = _text(row, 'image') or None
+    if image and len(image) > IMAGE_MAX:
+        raise RowError(f'image longer than {IMAGE_MAX} characters')
+
+    email = (seller_email or _text(row, 'seller_email')).lower() or None
+    return {
+        'title': title,
+        'description': _text(row, 'description'),
+        'specifications': _text(row, 'specifications'),
+        'price': price,
+        'category_id': category_id,
+        'subcategory_id': subcategory_id,
+        'seller_email': email,
+        'seller_id': lookups.seller_id(email) if email else None,
+        'image': image,
+        'active': _parse_active(row.get('active')),
+        'created_at': now,
+        'updated_at': now,
+        'expires_at': expires_at,
+    }
+
+
+def _insert_chunk(rows):
+    conn = db.session.connection()
+    products = Product.__table__
+    ids = conn.execute(products.insert().returning(products.c.id), rows).scalars().all()
+    if fts_supported(conn):
+        index_products(conn, ids)
+    adjust_facets_for(conn, ids, 1)
+    db.session.commit()
+    return ids, refresh_related_in_batches(ids, len(ids))
+
+
+def import_products(stream, fmt='csv', batch_size=500, seller_email=None, dry_run=False, progress=None):
+    """Validate and insert products from a CSV/JSONL stream, a chunk per commit.
+
+    Invalid rows are skipped and reported; valid rows are inserted even when
+    others fail. `progress(result)` is called after every committed chunk.
+    """
+    result = ImportResult(dry_run=dry_run)
+    lookups = _Lookups()
+    seller_email = (seller_email or '').strip().lower() or None
+    now = datetime.utcnow()
+    expires_at = now + timedelta(days=max_days())
+
+    chunk = []
+
+    def flush(chunk):
+        if dry_run:
+            result.inserted += len(chunk)
+        else:
+            ids, related = _insert_chunk(chunk)
+            result.inserted += len(ids)
+            result.related += related
+        result.batches += 1
+        if progress:
+            progress(result)
+
+    for line_num, row in read_rows(stream, fmt):
+        result.read += 1
+        try:
+            if isinstance(row, RowError):
+                raise row
+            chunk.append(_validate(row, lookups, seller_email, now, expires_at))
+        except RowError as e:
+            result.reject(line_num, str(e))
+            continue
+        if len(chunk) >= batch_size:
+            flush(chunk)
+            chunk = []
+    if chunk:
+        flush(chunk)
+    return result
+
+
+def iter_export_rows(active_only=False, batch_size=1000):
+    """Yield one dict per product (EXPORT_FIELDS keys), streamed from the database."""
+    stmt = (select(Product.id, Product.title, Product.description, Product.specifications,
+                   Product.price, Category.name, SubCategory.name, Product.seller_email,
+                   Product.image, Product.active, Product.created_at, Product.expires_at)
+            .outerjoin(Category, Category.id == Product.category_id)
+            .outerjoin(SubCategory, SubCategory.id == Product.subcategory_id)
+            .order_by(Product.id)
+            .execution_options(yield_per=batch_size))
+    if active_only:
+        stmt = stmt.where(Product.active == True)
+    for row in db.session.execute(stmt):
+        yield dict(zip(EXPORT_FIELDS, row))
+
+
+def export_products(stream, fmt='csv', active_only=False, batch_size=1000):
+    """Write the catalog to a text stream; returns the number of rows."""
+    count = 0
+    if fmt == 'csv':
+        writer = csv.DictWriter(stream, fieldnames=EXPORT_FIELDS)
+        writer.writeheader()
+    for row in iter_export_rows(active_only, batch_size):
+        for key in ('created_at', 'expires_at'):
+            row[key] = row[key].isoformat() if row[key] else None
+        if fmt == 'csv':
+            writer.writerow(row)
+        else:
+            stream.write(json.dumps(row, ensure_ascii=False) + '\n')
+        count += 1
+    return count
@@ -0,0 +1,128 @@
+"""
+Maintenance commands: `flask products ...` and `flask blog ...`.
+"""
+import sys
+from contextlib import nullcontext
+
+import click
+from flask.cli import AppGroup
+
+products_cli = AppGroup('products', help='Catalog maintenance commands.')
+
+
+@products_cli.command('rebuild-related')
+@click.option('--batch-size', default=500, show_default=True, help='Products per commit.')
+def rebuild_related_command(batch_size):
+    """Recompute the related-products table for every active product."""
+    from utils.related import rebuild_all_related
+    count = rebuild_all_related(batch_size=batch_size)
+    click.echo(f'Rebuilt related products for {count} products.')
+
+
+@products_cli.command('expire')
+@click.option('--delete', is_flag=True, help='Delete expired listings instead of deactivating them.')
+@click.option('--batch-size', default=500, show_default=True, help='Listings per batch/commit.')
+@click.option('--days', type=int, default=None,
+              help='Age limit for listings without expires_at (default: PRODUCT_MAX_DAYS).')
+@click.option('--dry-run', is_flag=True, help='Only count the expired listings.')
+def expire_command(delete, batch_size, days, dry_run):
+    """Deactivate or delete expired listings in batches."""
+    from utils.expiry import expire_products
+
+    action = 'delete' if delete else 'deactivate'
+
+    def report(done, total):
+        click.echo(f'  {done}/{total} listings processed')
+
+    result = expire_products(delete=delete, batch_size=batch_size, days=days, dry_run=dry_run, progress=report)
+    if dry_run:
+        click.echo(f'Dry run: would {action} {result.matched} expired listings.')
+        return
+    click.echo(f'{action.capitalize()}d {result.processed} listings in {result.batches} batches; '
+               f'removed {result.cart_lines} cart lines.')
+    if result.related:
+        click.echo(f'Recomputed {result.related} related-product lists.')
+
+
+@products_cli.command('rebuild-facets')
+def rebuild_facets_command():
+    """Recompute the marketplace facet counts from the product table."""
+    from db import db
+    from utils.facets import rebuild_facets
+    with db.engine.begin() as conn:
+        count = rebuild_facets(conn)
+    click.echo(f'Counted {count} active products.')
+
+
+def _open_text(path, mode, encoding):
+    # newline='' lets the csv module handle line endings inside quoted fields
+    if path == '-':
+        return nullcontext(sys.stdin if mode == 'r' else sys.stdout)
+    return open(path, mode, encoding=encoding, newline='')
+
+
+@products_cli.command('import')
+@click.argument('source', type=click.Path(exists=True, dir_okay=False, allow_dash=True))
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'jsonl']), default=None,
+              help='Input format (default: from the file extension, else csv).')
+@click.option('--batch-size', default=500, show_default=True, help='Rows per INSERT/commit.')
+@click.option('--seller-email', default=None, help='Assign every product to this seller.')
+@click.option('--dry-run', is_flag=True, help='Validate only; insert nothing.')
+def import_command(source, fmt, batch_size, seller_email, dry_run):
+    """Import products from a CSV or JSONL file (- for stdin)."""
+    from utils.catalog import format_for, import_products
+
+    def report(result):
+        click.echo(f'  {result.read} rows read, {result.inserted} valid', err=True)
+
+    with _open_text(source, 'r', 'utf-8-sig') as stream:
+        result = import_products(stream, format_for(source, fmt), batch_size=batch_size,
+                                 seller_email=seller_email, dry_run=dry_run, progress=report)
+    for line, message in result.errors:
+        click.echo(f'  line {line}: {message}', err=True)
+    if result.rejected > len(result.errors):
+        click.echo(f'  ... and {result.rejected - len(result.errors)} more', err=True)
+    verb = 'Would import' if dry_run else 'Imported'
+    click.echo(f'{verb} {result.inserted} of {result.read} rows in {result.batches} batches; '
+               f'rejected {result.rejected}.')
+    if result.related:
+        click.echo(f'Recomputed {result.related} related-product lists.')
+
+
+@products_cli.command('export')
+@click.argument('target', type=click.Path(dir_okay=False, writable=True, allow_dash=True), default='-')
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'jsonl']), default=None,
+              help='Output format (default: from the file extension, else csv).')
+@click.option('--active-only', is_flag=True, help='Skip inactive listings.')
+@click.option('--batch-size', default=1000, show_default=True, help='Rows fetched per round trip.')
+def export_command(target, fmt, active_only, batch_size):
+    """Export products as CSV or JSONL (default: stdout)."""
+    from utils.catalog import export_products, format_for
+    with _open_text(target, 'w', 'utf-8') as stream:
+        count = export_products(stream, format_for(target, fmt), active_only=active_only,
+                                batch_size=batch_size)
+    click.echo(f'Exported {count} products.', err=True)
+
+
+blog_cli = AppGroup('blog', help='Blog maintenance commands.')
+
+
+@blog_cli.command('reconcile-counters')
+def reconcile_counters_command():
+    """Recompute post like/comment counters from the likes and comments."""
+    from db import db
+    from utils.blog_counters import reconcile_counters
+    with db.engine.begin() as conn:
+        fixed = reconcile_counters(conn)
+    click.echo(f'Corrected counters on {fixed} posts.')
+
+
+@blog_cli.command('backfill-tags')
+@click.option('--batch-size', default=500, show_default=True, help='Posts per batch.')
+def backfill_tags_command(batch_size):
+    """Rebuild the tag/post_tags index from the posts' tag strings."""
+    from db import db
+    from utils.blog_tags import backfill_post_tags
+    with db.engine.begin() as conn:
+        posts, links = backfill_post_tags(conn, batch_size=batch_size)
+    click.echo(f'Indexed {links} tags on {posts} posts.')
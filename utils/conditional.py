@@ -0,0 +1,82 @@
+"""
+Conditional GET for detail pages.
+
+    @conditional_get(product_validator)
+    def product_detail(product_id): ...
+
+The validator receives the view arguments and returns (parts, last_modified)
+from one cheap query: the row's updated_at plus the newest/count of the
+children the page shows, and list_state() for sidebar lists (which read
+only the listed rows, never the whole table). None means "row not found" and lets the view run
+(and 404). The ETag also covers what the shared layout reads from the
+session (login, role, name, picture, cart badge), so a page is never reused
+across users. When it matches If-None-Match / If-Modified-Since we answer
+304 before any template rendering.
+
+Pages with pending flash messages are always rendered, since the flash is
+consumed by that render.
+"""
+import hashlib
+from functools import wraps
+
+from flask import make_response, request, session
+from sqlalchemy import func, select
+from werkzeug.http import is_resource_modified
+
+# Session keys read by base.html and the detail templates
+SESSION_KEYS = ('user_id', 'user_role', 'user_name', 'user_email', 'user_picture', 'cart_summary')
+
+
+def _etag(parts):
+    session_parts = [session.get(key) for key in SESSION_KEYS]
+    raw = repr((request.full_path, parts, session_parts)).encode()
+    return hashlib.sha1(raw).hexdigest()
+
+
+def latest(*stamps):
+    """Newest of the given datetimes, ignoring None."""
+    stamps = [s for s in stamps if s is not None]
+    return max(stamps) if stamps else None
+
+
+def list_state(stmt):
+    """(newest updated_at, sum of ids) scalar subqueries over a short list.
+
+    `stmt` selects `id` and `updated_at` with the page's own ORDER BY/LIMIT,
+    so it reads the listed rows through the sort index. An edit moves the
+    newest stamp; an entry added or removed changes the id sum.
+    """
+    rows = stmt.subquery()
+    return [select(func.max(rows.c.updated_at)).scalar_subquery(),
+            select(func.sum(rows.c.id)).scalar_subquery()]
+
+
+def conditional_get(validator):
+    def decorator(view):
+        @wraps(view)
+        def wrapped(*args, **kwargs):
+            if request.method not in ('GET', 'HEAD') or session.get('_flashes'):
+                return view(*args, **kwargs)
+            validated = validator(**kwargs)
+            if validated is None:
+                return view(*args, **kwargs)
+            parts, last_modified = validated
+            etag = _etag(parts)
+            if last_modified is not None:
+                last_modified = last_modified.replace(microsecond=0)
+
+            if not is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+                response = make_response('', 304)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag, weak=True)
+            if last_modified is not None:
+                response.last_modified = last_modified
+            # Per-user page: browsers may keep it but must revalidate each time
+            response.cache_control.private = True
+            response.cache_control.no_cache = True
+            return response
+        return wrapped
+    return decorator
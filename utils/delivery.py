@@ -0,0 +1,120 @@
+"""
+Serving uploaded media: /media/<path>.
+
+Templates link uploads through media_url() instead of the static route:
+
+    <video src="{{ media_url(m.file_path) }}">
+
+The endpoint answers Range requests (video/audio seeking, resumed
+downloads), If-None-Match / If-Modified-Since with a 304, and sets
+long-lived cache headers: content-addressed store files never change and
+are cached for a year as immutable, other uploads for MEDIA_MAX_AGE.
+
+With MEDIA_OFFLOAD set, Python only checks the path and the validators and
+hands the transfer to the front-end server, which also handles Range:
+
+    MEDIA_OFFLOAD=x-accel     X-Accel-Redirect: <MEDIA_ACCEL_PREFIX><path>  (nginx)
+    MEDIA_OFFLOAD=x-sendfile  X-Sendfile: <absolute path>   (Apache mod_xsendfile, lighttpd)
+
+nginx needs an internal location for the prefix, e.g.
+
+    location /_media/ { internal; alias /srv/agrifarma/static/; }
+
+Only files under static/uploads are served; temp files written while an
+upload is stored are not.
+"""
+import mimetypes
+import os
+from urllib.parse import quote
+from zlib import adler32
+
+from flask import abort, current_app, request, send_from_directory, url_for
+from werkzeug.security import safe_join
+
+from utils.storage import STORE_MAX_AGE, STORE_PREFIX
+
+UPLOADS_PREFIX = 'uploads/'
+HIDDEN_SUFFIXES = ('.part', '.tmp')
+DEFAULT_MAX_AGE = 24 * 3600
+OFFLOAD_MODES = ('x-accel', 'x-sendfile')
+
+
+def normalize_path(path):
+    """Static-relative form of a stored path ('static\\uploads\\x' -> 'uploads/x')."""
+    path = path.replace('\\', '/').lstrip('/')
+    if path.startswith('static/'):
+        path = path[len('static/'):]
+    return path
+
+
+def servable(path):
+    return path.startswith(UPLOADS_PREFIX) and not path.endswith(HIDDEN_SUFFIXES)
+
+
+def media_url(path):
+    """URL for an upload path as stored on a row; '' for none.
+
+    Remote URLs pass through, and paths outside static/uploads (bundled
+    sample images) stay on the static route.
+    """
+    if not path:
+        return ''
+    if path.startswith(('http://', 'https://')):
+        return path
+    path = normalize_path(path)
+    if servable(path):
+        return url_for('media.serve', filename=path)
+    return url_for('static', filename=path)
+
+
+def _max_age(path):
+    if path.startswith(STORE_PREFIX + '/'):
+        return STORE_MAX_AGE
+    return current_app.config.get('MEDIA_MAX_AGE', DEFAULT_MAX_AGE)
+
+
+def _offload(path, full_path, mode):
+    """Empty response carrying the validators and the hand-off header."""
+    stat = os.stat(full_path)
+    response = current_app.response_class(
+        mimetype=mimetypes.guess_type(path)[0] or 'application/octet-stream')
+    response.last_modified = stat.st_mtime
+    # Same ETag send_file would give, so switching modes keeps client caches valid
+    check = adler32(full_path.encode('utf-8')) & 0xFFFFFFFF
+    response.set_etag(f'{stat.st_mtime}-{stat.st_size}-{check}')
+    response = response.make_conditional(request.environ)
+    if response.status_code == 304:
+        return response
+    if mode == 'x-accel':
+        prefix = current_app.config.get('MEDIA_ACCEL_PREFIX', '/_media/')
+        response.headers['X-Accel-Redirect'] = prefix.rstrip('/') + '/' + quote(path)
+    else:
+        response.headers['X-Sendfile'] = full_path
+    return response
+
+
+def send_media(path):
+    """Response for /media/<path>; 404 unless it is a servable upload."""
+    path = normalize_path(path)
+    if not servable(path):
+        abort(404)
+    full_path = safe_join(current_app.static_folder, path)
+    if full_path is None or not os.path.isfile(full_path):
+        abort(404)
+
+    max_age = _max_age(path)
+    mode = current_app.config.get('MEDIA_OFFLOAD')
+    if mode in OFFLOAD_MODES:
+        response = _offload(path, full_path, mode)
+    else:
+        # Range, If-Range and the 304 are handled by send_file(conditional=True)
+        response = send_from_directory(current_app.static_folder, path, max_age=max_age)
+        # werkzeug only sets it on 206s; players look for it before seeking
+        response.accept_ranges = 'bytes'
+
+    response.cache_control.no_cache = None
+    response.cache_control.public = True
+    response.cache_control.max_age = max_age
+    if path.startswith(STORE_PREFIX + '/'):
+        response.cache_control.immutable = True
+    return response
@@ -0,0 +1,128 @@
+"""
+Listing expiry.
+
+New products get expires_at = created_at + PRODUCT_MAX_DAYS, and a listing
+that is reactivated (active False -> True) gets a fresh now + PRODUCT_MAX_DAYS
+so the next run doesn't expire it again straight away. expire_products()
+then deactivates or deletes expired listings set-based, in batches of
+`batch_size` ids, committing after each batch so a large cleanup never
+holds the SQLite write lock for long. Each batch removes the products'
+cart lines in the same transaction.
+
+Listings created before expires_at existed (NULL) expire by created_at.
+Both columns are indexed, so picking each batch is an index range scan.
+
+Bulk statements bypass ORM events, so facet counts are adjusted here and
+deletes also maintain the search index, related products and stored-file
+references. Products that listed a deleted one get new neighbours at the
+end of the run.
+"""
+from datetime import datetime, timedelta
+
+from flask import current_app, has_app_context
+from sqlalchemy import and_, event, func, inspect, or_, select
+
+from db import db
+from models.cart_item import CartItem
+from models.product import Product
+from models.product_related import ProductRelated
+from utils.facets import adjust_facets_for
+from utils.related import refresh_related_in_batches
+from utils.search import fts_supported, unindex_products
+from utils.storage import release_uploads
+
+DEFAULT_MAX_DAYS = 30
+
+
+def max_days():
+    if has_app_context():
+        return current_app.config.get('PRODUCT_MAX_DAYS', DEFAULT_MAX_DAYS)
+    return DEFAULT_MAX_DAYS
+
+
+@event.listens_for(Product, 'before_insert')
+def _set_expiry(mapper, connection, target):
+    if target.expires_at is None:
+        created = target.created_at or datetime.utcnow()
+        target.expires_at = created + timedelta(days=max_days())
+
+
+@event.listens_for(Product, 'before_update')
+def _renew_expiry(mapper, connection, target):
+    history = inspect(target).attrs.active.history
+    if target.active and False in history.deleted:
+        target.expires_at = datetime.utcnow() + timedelta(days=max_days())
+
+
+def expired_filter(now=None, days=None):
+    """WHERE clause matching listings that have expired at `now`."""
+    now = now or datetime.utcnow()
+    days = max_days() if days is None else days
+    return or_(
+        Product.expires_at <= now,
+        and_(Product.expires_at.is_(None), Product.created_at < now - timedelta(days=days)),
+    )
+
+
+class ExpiryResult:
+    def __init__(self, matched=0, processed=0, cart_lines=0, batches=0, dry_run=False):
+        self.matched = matched
+        self.processed = processed
+        self.cart_lines = cart_lines
+        self.batches = batches
+        self.related = 0
+        self.dry_run = dry_run
+
+
+def expire_products(delete=False, batch_size=500, days=None, now=None, dry_run=False, progress=None):
+    """Deactivate (default) or delete expired listings in batches.
+
+    `progress(done, total)` is called after every committed batch.
+    """
+    criteria = expired_filter(now, days)
+    if not delete:
+        criteria = and_(criteria, Product.active == True)
+    total = db.session.scalar(select(func.count(Product.id)).where(criteria))
+    result = ExpiryResult(matched=total, dry_run=dry_run)
+    if dry_run or not total:
+        return result
+
+    products = Product.__table__
+    carts = CartItem.__table__
+    neighbours = set()
+    last_id = 0
+    while True:
+        # Walk forward by id: rows we just deactivated/deleted never come back
+        ids = db.session.scalars(
+            select(Product.id).where(criteria, Product.id > last_id)
+            .order_by(Product.id).limit(batch_size)).all()
+        if not ids:
+            break
+        last_id = ids[-1]
+
+        result.cart_lines += db.session.execute(
+            carts.delete().where(carts.c.product_id.in_(ids))).rowcount
+        adjust_facets_for(db.session.connection(), ids, -1)
+        if delete:
+            neighbours.update(db.session.scalars(
+                select(ProductRelated.product_id).where(ProductRelated.related_id.in_(ids))))
+            db.session.execute(ProductRelated.__table__.delete().where(or_(
+                ProductRelated.product_id.in_(ids), ProductRelated.related_id.in_(ids))))
+            release_uploads(db.session.scalars(select(Product.image).where(Product.id.in_(ids))))
+            if fts_supported(db.engine):
+                unindex_products(db.session.connection(), ids)
+            db.session.execute(products.delete().where(products.c.id.in_(ids)))
+        else:
+            db.session.execute(products.update().where(products.c.id.in_(ids)).values(active=False))
+        db.session.commit()
+
+        result.processed += len(ids)
+        result.batches += 1
+        if progress:
+            progress(result.processed, total)
+
+    db.session.expire_all()
+    if neighbours:
+        # Products that listed a deleted one as related need new neighbours
+        result.related = refresh_related_in_batches(neighbours, batch_size)
+    return result
@@ -0,0 +1,230 @@
+"""
+Marketplace facet counts.
+
+product_facet holds the number of active products per (category,
+subcategory, price bucket). Product insert/update/delete events adjust the
+affected rows with upserts inside the same flush, so the filters on
+product_list read a small summary table instead of grouping the product
+table on every request. Bulk jobs that bypass the ORM call
+adjust_facets_for() with the affected ids, and `flask products
+rebuild-facets` recomputes the table from scratch.
+
+Counts are catalog-wide: they ignore the search box, which keeps the cost
+of a listing request constant.
+"""
+from bisect import bisect_right
+
+from sqlalchemy import bindparam, case, event, func, inspect, or_, select
+from sqlalchemy.dialects import postgresql, sqlite
+
+from db import db
+from models.category import Category, SubCategory
+from models.product import Product
+from models.product_facet import ProductFacet
+
+# (low, high) price ranges; high is exclusive, None means open-ended
+PRICE_BUCKETS = (
+    (0, 25),
+    (25, 50),
+    (50, 100),
+    (100, 500),
+    (500, None),
+)
+_BOUNDS = [low for low, _ in PRICE_BUCKETS[1:]]
+
+FACET_COLUMNS = ('active', 'category_id', 'subcategory_id', 'price')
+
+
+def price_bucket(price):
+    return bisect_right(_BOUNDS, price or 0)
+
+
+def price_bucket_label(bucket):
+    low, high = PRICE_BUCKETS[bucket]
+    if high is None:
+        return f'${low}+'
+    if low == 0:
+        return f'Under ${high}'
+    return f'${low} - ${high}'
+
+
+def price_bucket_filter(bucket):
+    """WHERE clause restricting Product.price to one bucket.
+
+    Compares the bare column so ix_product_active_price can serve the range;
+    NULL prices count as 0 and only need the extra test in the first bucket.
+    """
+    low, high = PRICE_BUCKETS[bucket]
+    price = Product.price
+    if high is None:
+        return price >= low
+    if low == 0:
+        return or_(price < high, price.is_(None))
+    return (price >= low) & (price < high)
+
+
+def _bucket_expr(price):
+    return case(*[(price < low, i) for i, low in enumerate(_BOUNDS)], else_=len(_BOUNDS))
+
+
+# --------------------------
+# Maintenance
+# --------------------------
+def _upsert_stmt(conn):
+    dialect = postgresql if conn.dialect.name == 'postgresql' else sqlite
+    stmt = dialect.insert(ProductFacet).values(
+        category_id=bindparam('b_category'),
+        subcategory_id=bindparam('b_subcategory'),
+        price_bucket=bindparam('b_bucket'),
+        count=bindparam('b_delta'),
+    )
+    return stmt.on_conflict_do_update(
+        index_elements=[ProductFacet.category_id, ProductFacet.subcategory_id, ProductFacet.price_bucket],
+        set_={'count': ProductFacet.count + stmt.excluded.count},
+    )
+
+
+def apply_deltas(conn, deltas):
+    """Add {(category, subcategory, bucket): delta} to the summary table."""
+    params = [
+        {'b_category': c, 'b_subcategory': s, 'b_bucket': b, 'b_delta': delta}
+        for (c, s, b), delta in deltas.items() if delta
+    ]
+    if params:
+        conn.execute(_upsert_stmt(conn), params)
+
+
+def _key(category_id, subcategory_id, price):
+    return (category_id or 0, subcategory_id or 0, price_bucket(price))
+
+
+def adjust_facets_for(conn, product_ids, sign=-1):
+    """Add (sign=1) or remove (sign=-1) the active products in `product_ids`.
+
+    For bulk statements that skip ORM events: call with sign=-1 before
+    deactivating/deleting, or with sign=1 after inserting/activating.
+    """
+    product_ids = list(product_ids)
+    if not product_ids:
+        return
+    rows = conn.execute(
+        select(Product.category_id, Product.subcategory_id, Product.price)
+        .where(Product.id.in_(product_ids), Product.active == True)
+    ).all()
+    deltas = {}
+    for category_id, subcategory_id, price in rows:
+        key = _key(category_id, subcategory_id, price)
+        deltas[key] = deltas.get(key, 0) + sign
+    apply_deltas(conn, deltas)
+
+
+def rebuild_facets(conn):
+    conn.execute(ProductFacet.__table__.delete())
+    category = func.coalesce(Product.category_id, 0)
+    subcategory = func.coalesce(Product.subcategory_id, 0)
+    bucket = _bucket_expr(func.coalesce(Product.price, 0))
+    grouped = (select(category, subcategory, bucket, func.count())
+               .where(Product.active == True)
+               .group_by(category, subcategory, bucket))
+    conn.execute(ProductFacet.__table__.insert().from_select(
+        ['category_id', 'subcategory_id', 'price_bucket', 'count'], grouped))
+    return conn.execute(select(func.coalesce(func.sum(ProductFacet.count), 0))).scalar()
+
+
+def _load_old_value(target, value, oldvalue, initiator):
+    pass
+
+
+# Make assignments load the old value even when the attribute was expired
+# (e.g. after a commit), so _previous() can find the row being left.
+for _column in FACET_COLUMNS:
+    event.listen(getattr(Product, _column), 'set', _load_old_value, active_history=True)
+
+
+def _previous(state, attr):
+    history = state.attrs[attr].history
+    if history.has_changes():
+        return history.deleted[0] if history.deleted else None
+    return getattr(state.object, attr)
+
+
+@event.listens_for(Product, 'after_insert')
+def _count_new_product(mapper, connection, target):
+    if target.active:
+        apply_deltas(connection, {_key(target.category_id, target.subcategory_id, target.price): 1})
+
+
+@event.listens_for(Product, 'after_update')
+def _recount_product(mapper, connection, target):
+    state = inspect(target)
+    if not any(state.attrs[col].history.has_changes() for col in FACET_COLUMNS):
+        return
+    deltas = {}
+    if _previous(state, 'active'):
+        old = _key(_previous(state, 'category_id'), _previous(state, 'subcategory_id'), _previous(state, 'price'))
+        deltas[old] = deltas.get(old, 0) - 1
+    if target.active:
+        new = _key(target.category_id, target.subcategory_id, target.price)
+        deltas[new] = deltas.get(new, 0) + 1
+    apply_deltas(connection, deltas)
+
+
+@event.listens_for(Product, 'before_delete')
+def _uncount_product(mapper, connection, target):
+    state = inspect(target)
+    if _previous(state, 'active'):
+        old = _key(_previous(state, 'category_id'), _previous(state, 'subcategory_id'), _previous(state, 'price'))
+        apply_deltas(connection, {old: -1})
+
+
+# --------------------------
+# Querying
+# --------------------------
+class FacetOption:
+    def __init__(self, value, label, count, selected=False):
+        self.value = value
+        self.label = label
+        self.count = count
+        self.selected = selected
+
+
+class Facets:
+    def __init__(self, categories, subcategories, prices):
+        self.categories = categories
+        self.subcategories = subcategories
+        self.prices = prices
+
+
+def facet_counts(category_id=None, subcategory_id=None, bucket=None):
+    """Filter options with counts, each honouring the *other* selected filters.
+
+    One query over the summary table, joined to the category names.
+    """
+    rows = (db.session.query(ProductFacet.category_id, ProductFacet.subcategory_id,
+                             ProductFacet.price_bucket, ProductFacet.count,
+                             Category.name, SubCategory.name)
+            .outerjoin(Category, Category.id == ProductFacet.category_id)
+            .outerjoin(SubCategory, SubCategory.id == ProductFacet.subcategory_id)
+            .filter(ProductFacet.count > 0)
+            .all())
+
+    categories, subcategories, prices = {}, {}, [0] * len(PRICE_BUCKETS)
+    for cat, sub, b, count, cat_name, sub_name in rows:
+        if bucket is None or b == bucket:
+            if cat and cat_name:
+                entry = categories.setdefault(cat, [cat_name, 0])
+                entry[1] += count
+            if cat == category_id and sub and sub_name:
+                entry = subcategories.setdefault(sub, [sub_name, 0])
+                entry[1] += count
+        if (category_id is None or cat == category_id) and (subcategory_id is None or sub == subcategory_id):
+            prices[b] += count
+
+    return Facets(
+        categories=[FacetOption(cid, name, n, cid == category_id)
+                    for cid, (name, n) in sorted(categories.items(), key=lambda item: item[1][0])],
+        subcategories=[FacetOption(sid, name, n, sid == subcategory_id)
+                       for sid, (name, n) in sorted(subcategories.items(), key=lambda item: item[1][0])],
+        prices=[FacetOption(b, price_bucket_label(b), n, b == bucket)
+                for b, n in enumerate(prices) if n or b == bucket],
+    )
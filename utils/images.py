@@ -0,0 +1,154 @@
+"""
+Responsive image renditions for uploaded product images.
+
+On upload we hand the original to a small process pool that writes fixed
+renditions next to it, in WebP plus a JPEG fallback:
+
+    uploads/products/<name>.jpg -> <name>.thumb.webp, <name>.thumb.jpg,
+                                   <name>.card.webp,  <name>.card.jpg, ...
+
+Templates call rendition_srcset()/rendition_url() and fall back to the
+original file until the renditions exist (or when Pillow is not installed).
+"""
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from flask import current_app
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow is optional; without it originals are served as-is
+    Image = None
+
+# name -> max width in pixels (aspect ratio is kept, never upscaled)
+RENDITIONS = {
+    'thumb': 160,
+    'card': 480,
+    'detail': 1200,
+}
+FORMATS = ('webp', 'jpg')
+WEBP_QUALITY = 80
+JPEG_QUALITY = 82
+
+_executor = None
+_ready = set()
+
+logger = logging.getLogger(__name__)
+
+
+def rendition_path(image, name, fmt):
+    """'uploads/products/abc.png' -> 'uploads/products/abc.card.webp'"""
+    stem = os.path.splitext(image)[0]
+    return f"{stem}.{name}.{fmt}"
+
+
+def _render_renditions(source):
+    """Worker entry point: write every rendition of `source` (absolute path)."""
+    with Image.open(source) as original:
+        original = ImageOps.exif_transpose(original)
+        for name, width in RENDITIONS.items():
+            img = original.copy()
+            img.thumbnail((width, width * 4))
+            rgb = img.convert('RGB')
+            for fmt in FORMATS:
+                target = rendition_path(source, name, fmt)
+                tmp = f"{target}.{os.getpid()}.tmp"  # concurrent jobs for one file
+                if fmt == 'webp':
+                    img_out = img if img.mode in ('RGB', 'RGBA') else rgb
+                    img_out.save(tmp, 'WEBP', quality=WEBP_QUALITY, method=4)
+                else:
+                    rgb.save(tmp, 'JPEG', quality=JPEG_QUALITY, optimize=True, progressive=True)
+                os.replace(tmp, target)
+    return source
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        workers = current_app.config.get('IMAGE_WORKERS', 2)
+        # forkserver keeps the app's threads and DB connections out of the workers
+        methods = multiprocessing.get_all_start_methods()
+        context = multiprocessing.get_context('forkserver' if 'forkserver' in methods else None)
+        _executor = ProcessPoolExecutor(max_workers=workers, mp_context=context)
+    return _executor
+
+
+def generate_renditions(image):
+    """Queue rendition generation for an uploaded image (static-relative path).
+
+    A no-op when the renditions already exist, e.g. for a deduplicated upload.
+    """
+    if Image is None or has_renditions(image):
+        return None
+    source = os.path.join(current_app.static_folder, image)
+    future = _get_executor().submit(_render_renditions, source)
+    future.add_done_callback(_log_failure)
+    return future
+
+
+def _log_failure(future):
+    global _executor
+    error = future.exception()
+    if error is not None:
+        # Runs on the executor's callback thread, outside any app context
+        logger.error('Could not generate image renditions', exc_info=error)
+        if isinstance(error, BrokenProcessPool):
+            # A worker died; start a fresh pool on the next upload
+            _executor = None
+
+
+def rendition_files(image):
+    """Relative paths of every rendition of `image` (for cleanup)."""
+    return [rendition_path(image, name, fmt) for name in RENDITIONS for fmt in FORMATS]
+
+
+def delete_renditions(image):
+    _ready.discard(image)
+    for path in rendition_files(image):
+        try:
+            os.remove(os.path.join(current_app.static_folder, path))
+        except FileNotFoundError:
+            pass
+
+
+def has_renditions(image):
+    """True once the worker has written the last rendition for `image`."""
+    if not image or image.startswith('http'):
+        return False
+    if image in _ready:
+        return True
+    last_name = list(RENDITIONS)[-1]
+    if os.path.exists(os.path.join(current_app.static_folder, rendition_path(image, last_name, FORMATS[-1]))):
+        _ready.add(image)
+        return True
+    return False
+
+
+# --------------------------
+# Template helpers
+# --------------------------
+def rendition_url(image, name='card', fmt='jpg'):
+    """URL of one rendition, or of the original until renditions exist."""
+    if not image:
+        return ''
+    if image.startswith('http'):
+        return image
+    # utils.delivery imports utils.storage, which imports this module
+    from utils.delivery import media_url
+    if has_renditions(image):
+        return media_url(rendition_path(image, name, fmt))
+    return media_url(image)
+
+
+def rendition_srcset(image, fmt='webp'):
+    """srcset covering every rendition width, or '' if none exist yet."""
+    if not has_renditions(image):
+        return ''
+    from utils.delivery import media_url
+    return ', '.join(
+        f"{media_url(rendition_path(image, name, fmt))} {width}w"
+        for name, width in RENDITIONS.items()
+    )
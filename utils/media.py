@@ -0,0 +1,210 @@
+"""
+Upload reconciliation: `flask media reconcile`.
+
+Compares the files under static/uploads with every column that stores an
+upload path and reports:
+
+  * missing  - rows pointing at files that do not exist
+  * orphans  - files no row points at (image renditions belong to their
+               original; half-written .part/.tmp files are always orphans)
+
+Orphans older than the grace period can be deleted, a batch at a time, so
+disk usage tracks live data. The grace period keeps uploads whose row has
+not been committed yet out of harm's way. On the same --delete pass
+stored_file refcounts are corrected from the actual references and
+chunked upload sessions idle for longer than the grace period are dropped
+along with their staged parts. Without --delete nothing is written;
+mismatches and stale sessions are only counted.
+"""
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+
+from db import db
+from models.blog_media import BlogMedia
+from models.consultant import Consultant
+from models.product import Product
+from models.stored_file import StoredFile
+from models.user import User
+from utils.delivery import normalize_path
+from utils.images import FORMATS, RENDITIONS
+from utils.storage import delete_if_unused
+from utils.uploads import drop_stale_uploads, stale_uploads
+
+UPLOADS_DIR = 'uploads'
+# (model, column) pairs holding static-relative upload paths
+MEDIA_COLUMNS = (
+    (User, 'picture'),
+    (Product, 'image'),
+    (Consultant, 'profile_picture'),
+    (BlogMedia, 'file_path'),
+)
+TEMP_SUFFIXES = ('.part', '.tmp')
+
+_RENDITION_RE = re.compile(
+    r'^(?P<stem>.+)\.(?:%s)\.(?:%s)$' % ('|'.join(RENDITIONS), '|'.join(FORMATS)))
+
+
+class ReconcileReport:
+    def __init__(self):
+        self.scanned = 0
+        self.scanned_bytes = 0
+        self.missing = []         # (path, [(table, id), ...])
+        self.orphans = []         # (path, size, mtime), oldest first
+        self.expired = []         # orphans past the grace period
+        self.deleted = []
+        self.deleted_bytes = 0
+        self.refcounts_fixed = 0
+        self.stale_uploads = 0
+
+
+def referenced_paths():
+    """{path: [(table, id), ...]} for every local file a row points at."""
+    refs = {}
+    for model, attr in MEDIA_COLUMNS:
+        column = getattr(model, attr)
+        rows = db.session.query(model.id, column).filter(column.isnot(None), column != '')
+        for row_id, value in rows:
+            if value.startswith(('http://', 'https://')):
+                continue
+            refs.setdefault(normalize_path(value), []).append((model.__tablename__, row_id))
+    return refs
+
+
+def _stat(path):
+    try:
+        return path, os.stat(path)
+    except FileNotFoundError:
+        return path, None
+
+
+def scan_uploads(workers=8):
+    """{relative path: os.stat_result} for every file under static/uploads.
+
+    Directory listing is cheap; the per-file stat calls run on a thread pool.
+    """
+    static = current_app.static_folder
+    files = []
+    for dirpath, _, filenames in os.walk(os.path.join(static, UPLOADS_DIR)):
+        files.extend(os.path.join(dirpath, name) for name in filenames)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        stats = list(pool.map(_stat, files))
+    return {os.path.relpath(path, static).replace(os.sep, '/'): st for path, st in stats if st is not None}
+
+
+def _is_owned(path, referenced, referenced_stems):
+    if path.endswith(TEMP_SUFFIXES):
+        return False
+    if path in referenced:
+        return True
+    match = _RENDITION_RE.match(path)
+    return bool(match) and match.group('stem') in referenced_stems
+
+
+def _fix_refcounts(refs, apply=True):
+    """Count (and with `apply`, correct) stored_file refcounts that disagree
+    with the actual references."""
+    fixed = 0
+    for stored in StoredFile.query.all():
+        actual = len(refs.get(stored.path, ()))
+        if actual and stored.refcount != actual:
+            if apply:
+                stored.refcount = actual
+            fixed += 1
+    return fixed
+
+
+def reconcile_uploads(grace=timedelta(hours=24), delete=False, limit=500, workers=8):
+    report = ReconcileReport()
+    if delete:
+        report.stale_uploads = drop_stale_uploads(grace)
+    else:
+        report.stale_uploads = stale_uploads(datetime.utcnow() - grace).count()
+    refs = referenced_paths()
+    files = scan_uploads(workers)
+    report.scanned = len(files)
+    report.scanned_bytes = sum(st.st_size for st in files.values())
+
+    # Files outside static/uploads (e.g. seeded images/...) aren't in the scan
+    static = current_app.static_folder
+    outside = [p for p in refs if p not in files and not p.startswith(UPLOADS_DIR + '/')]
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        outside_stats = pool.map(_stat, [os.path.join(static, p) for p in outside])
+        found_outside = {p for p, (_, st) in zip(outside, outside_stats) if st is not None}
+    report.missing = sorted((p, owners) for p, owners in refs.items()
+                            if p not in files and p not in found_outside)
+
+    referenced_stems = {os.path.splitext(p)[0] for p in refs}
+    cutoff = (datetime.now() - grace).timestamp()
+    for path, st in sorted(files.items(), key=lambda item: item[1].st_mtime):
+        if _is_owned(path, refs, referenced_stems):
+            continue
+        report.orphans.append((path, st.st_size, st.st_mtime))
+        if st.st_mtime < cutoff:
+            report.expired.append((path, st.st_size, st.st_mtime))
+
+    # A dry run only reports: nothing below writes unless `delete` is set
+    report.refcounts_fixed = _fix_refcounts(refs, apply=delete)
+    if not delete:
+        return report
+    db.session.commit()
+    for path, size, _ in report.expired[:limit]:
+        # Re-checked under the write lock: the file may have been re-uploaded
+        # (which refreshes its mtime) since the scan
+        if delete_if_unused(path, older_than=cutoff):
+            report.deleted.append(path)
+            report.deleted_bytes += size
+    return report
+
+
+def _mb(size):
+    return f'{size / (1024 * 1024):.1f} MB'
+
+
+# --------------------------
+# CLI: flask media ...
+# --------------------------
+media_cli = AppGroup('media', help='Manage uploaded files.')
+
+
+@media_cli.command('reconcile')
+@click.option('--grace-hours', default=24, show_default=True, help='Only delete orphans older than this.')
+@click.option('--delete', is_flag=True, help='Delete expired orphans (default is a dry run).')
+@click.option('--limit', default=500, show_default=True, help='Maximum files to delete per run.')
+@click.option('--workers', default=8, show_default=True, help='Threads used for stat calls.')
+@click.option('--verbose', '-v', is_flag=True, help='List every missing and orphaned file.')
+def reconcile_command(grace_hours, delete, limit, workers, verbose):
+    """Report missing/orphaned uploads and garbage-collect orphans."""
+    report = reconcile_uploads(timedelta(hours=grace_hours), delete, limit, workers)
+    click.echo(f'Scanned {report.scanned} files ({_mb(report.scanned_bytes)}) under static/{UPLOADS_DIR}.')
+
+    click.echo(f'Missing: {len(report.missing)} referenced files do not exist.')
+    if verbose:
+        for path, owners in report.missing:
+            where = ', '.join(f'{table} #{row_id}' for table, row_id in owners)
+            click.echo(f'  {path} ({where})')
+
+    orphan_bytes = sum(size for _, size, _ in report.orphans)
+    click.echo(f'Orphans: {len(report.orphans)} files ({_mb(orphan_bytes)}), '
+               f'{len(report.expired)} older than {grace_hours}h.')
+    if verbose:
+        for path, size, mtime in report.orphans:
+            click.echo(f'  {path} ({size} bytes, {datetime.fromtimestamp(mtime):%Y-%m-%d %H:%M})')
+
+    if report.stale_uploads:
+        state = 'Dropped' if delete else 'Found'
+        click.echo(f'{state} {report.stale_uploads} chunked uploads idle for more than {grace_hours}h.')
+    if report.refcounts_fixed:
+        state = 'Corrected' if delete else 'Would correct'
+        click.echo(f'{state} {report.refcounts_fixed} stored file reference counts.')
+    if delete:
+        click.echo(f'Deleted {len(report.deleted)} orphaned files ({_mb(report.deleted_bytes)}).')
+        if len(report.expired) > len(report.deleted):
+            click.echo(f'{len(report.expired) - len(report.deleted)} remain; run again to continue.')
+    elif report.expired:
+        click.echo('Dry run: pass --delete to remove expired orphans.')
@@ -0,0 +1,127 @@
+"""
+Keyset (cursor) pagination.
+
+Instead of OFFSET + COUNT(*), each page is fetched with a WHERE clause that
+continues from the sort key of the last row seen, so page N costs the same
+as page 1. Cursors are opaque URL-safe tokens holding that sort key.
+
+`order` is a sequence of (expression, 'asc' | 'desc') pairs. The last pair
+must be unique (normally the primary key) so the ordering is total. Key
+expressions are compared with = and < so they should never be NULL; wrap
+sparsely populated columns in coalesce().
+"""
+import base64
+import binascii
+import json
+from datetime import datetime
+
+from sqlalchemy import and_, or_
+
+DEFAULT_PER_PAGE = 12
+MAX_PER_PAGE = 60
+
+
+class KeysetPage:
+    def __init__(self, items, per_page, has_next, has_prev, next_cursor, prev_cursor):
+        self.items = items
+        self.per_page = per_page
+        self.has_next = has_next
+        self.has_prev = has_prev
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+
+def clamp_per_page(value, default=DEFAULT_PER_PAGE, maximum=MAX_PER_PAGE):
+    """Bound a user-supplied page size to 1..maximum."""
+    if not value or value < 1:
+        return default
+    return min(value, maximum)
+
+
+def _encode_value(value):
+    if isinstance(value, datetime):
+        return {'dt': value.isoformat()}
+    return value
+
+
+def _decode_value(value):
+    if isinstance(value, dict) and 'dt' in value:
+        return datetime.fromisoformat(value['dt'])
+    return value
+
+
+def encode_cursor(values, direction):
+    payload = json.dumps({'d': direction, 'k': [_encode_value(v) for v in values]}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, key_count):
+    """Return (values, direction) or (None, None) for a missing/invalid cursor."""
+    if not cursor:
+        return None, None
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        values = [_decode_value(v) for v in payload['k']]
+        direction = payload['d']
+    except (ValueError, KeyError, TypeError, binascii.Error):
+        return None, None
+    if direction not in ('n', 'p') or len(values) != key_count:
+        return None, None
+    return values, direction
+
+
+def _after(order, values):
+    """WHERE clause selecting rows strictly after `values` in `order`."""
+    clauses = []
+    for i, (expr, direction) in enumerate(order):
+        step = expr > values[i] if direction == 'asc' else expr < values[i]
+        ties = [order[j][0] == values[j] for j in range(i)]
+        clauses.append(and_(*ties, step))
+    return or_(*clauses)
+
+
+def _reverse(order):
+    return [(expr, 'desc' if direction == 'asc' else 'asc') for expr, direction in order]
+
+
+def _order_by(order):
+    return [expr.asc() if direction == 'asc' else expr.desc() for expr, direction in order]
+
+
+def keyset_paginate(query, order, cursor=None, per_page=DEFAULT_PER_PAGE):
+    """Fetch one page of `query` (a single-entity query) in `order`.
+
+    Costs a single SELECT ... LIMIT per_page + 1 regardless of depth.
+    """
+    order = list(order)
+    values, direction = decode_cursor(cursor, len(order))
+    backwards = direction == 'p'
+    effective = _reverse(order) if backwards else order
+
+    keyed = query.add_columns(*[expr.label(f'_key{i}') for i, (expr, _) in enumerate(order)])
+    if values is not None:
+        keyed = keyed.filter(_after(effective, values))
+    rows = keyed.order_by(None).order_by(*_order_by(effective)).limit(per_page + 1).all()
+
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    if backwards:
+        rows.reverse()
+
+    items = [row[0] for row in rows]
+    keys = [tuple(row[1:]) for row in rows]
+    if backwards:
+        has_prev, has_next = has_more, True
+    else:
+        has_prev, has_next = values is not None, has_more
+
+    next_cursor = encode_cursor(keys[-1], 'n') if has_next and keys else None
+    prev_cursor = encode_cursor(keys[0], 'p') if has_prev and keys else None
+    return KeysetPage(items, per_page, bool(next_cursor), bool(prev_cursor), next_cursor, prev_cursor)
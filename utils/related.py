@@ -0,0 +1,221 @@
+"""
+Related-products builder.
+
+Each product keeps its top RELATED_LIMIT neighbours in the product_related
+table. Candidates come from the same category, nearby prices and products
+that shared a cart with it. They are scored on:
+
+  * same category / subcategory
+  * price proximity (1.0 for equal prices, falling to 0 at double the price)
+  * cart co-occurrence (how many users have both products in their cart)
+
+Product inserts/updates/deletes mark the product dirty, and just before
+the transaction commits the same session refreshes it plus every product
+that listed it as a neighbour, so the new lists commit with the edit and
+no second writer competes for the database. A deleted product's rows are
+removed explicitly: SQLite does not enforce the ON DELETE CASCADE while
+foreign keys are off. Bulk statements skip these events; `flask products
+rebuild-related` recomputes the whole table, which also picks up
+co-occurrence drift from cart activity.
+"""
+import math
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import event, func, inspect, or_, select, text
+
+from db import db
+from models.product import Product
+from models.product_related import ProductRelated
+
+RELATED_LIMIT = 4
+CANDIDATE_LIMIT = 50
+
+CATEGORY_WEIGHT = 3.0
+SUBCATEGORY_WEIGHT = 2.0
+PRICE_WEIGHT = 1.0
+CO_CART_WEIGHT = 1.5
+
+# Product columns that influence scoring; other edits don't need a refresh
+SCORED_COLUMNS = ('active', 'category_id', 'subcategory_id', 'price')
+
+
+# --------------------------
+# Scoring
+# --------------------------
+def _price_proximity(a, b):
+    a, b = a or 0.0, b or 0.0
+    scale = max(a, b)
+    if scale <= 0:
+        return 1.0
+    return max(0.0, 1.0 - abs(a - b) / scale)
+
+
+def _co_cart_counts(product_id):
+    rows = db.session.execute(text(
+        "SELECT other.product_id, COUNT(DISTINCT other.user_id) AS n "
+        "FROM cart_items AS mine JOIN cart_items AS other "
+        "ON other.user_id = mine.user_id AND other.product_id != mine.product_id "
+        "WHERE mine.product_id = :pid "
+        "GROUP BY other.product_id ORDER BY n DESC LIMIT :limit"
+    ), {'pid': product_id, 'limit': CANDIDATE_LIMIT}).all()
+    return {pid: n for pid, n in rows}
+
+
+def _candidates(product, co_counts):
+    price_distance = func.abs(func.coalesce(Product.price, 0) - (product.price or 0))
+    base = Product.query.filter(Product.active == True, Product.id != product.id)
+
+    candidates = {}
+    if product.category_id:
+        same_category = base.filter(Product.category_id == product.category_id)
+        for p in same_category.order_by(price_distance).limit(CANDIDATE_LIMIT):
+            candidates[p.id] = p
+    if co_counts:
+        for p in base.filter(Product.id.in_(list(co_counts))):
+            candidates[p.id] = p
+    if len(candidates) < RELATED_LIMIT:
+        # Sparse category: pad with the closest prices anywhere in the catalog
+        for p in base.order_by(price_distance).limit(CANDIDATE_LIMIT):
+            candidates.setdefault(p.id, p)
+    return candidates.values()
+
+
+def score_related(product, candidate, co_count=0):
+    score = PRICE_WEIGHT * _price_proximity(product.price, candidate.price)
+    if product.category_id and candidate.category_id == product.category_id:
+        score += CATEGORY_WEIGHT
+        if product.subcategory_id and candidate.subcategory_id == product.subcategory_id:
+            score += SUBCATEGORY_WEIGHT
+    if co_count:
+        score += CO_CART_WEIGHT * math.log1p(co_count)
+    return score
+
+
+def _rebuild_one(product_id, now):
+    # Runs in the committing session: drop any loaded rows along with the old list
+    ProductRelated.query.filter_by(product_id=product_id).delete(synchronize_session='evaluate')
+    product = db.session.get(Product, product_id)
+    if product is None or not product.active:
+        return
+    co_counts = _co_cart_counts(product_id)
+    scored = sorted(
+        ((score_related(product, c, co_counts.get(c.id, 0)), c.id) for c in _candidates(product, co_counts)),
+        key=lambda pair: (-pair[0], pair[1]),
+    )
+    for rank, (score, related_id) in enumerate(scored[:RELATED_LIMIT]):
+        db.session.add(ProductRelated(product_id=product_id, rank=rank, related_id=related_id,
+                                      score=score, updated_at=now))
+
+
+def refresh_related(product_ids):
+    """Recompute neighbours for `product_ids` and the products around them.
+
+    Besides the changed products themselves this refreshes every product
+    that listed one of them (the old neighbourhood) and every product they
+    now list (the new neighbourhood), so a new listing shows up on its
+    neighbours' pages without a full rebuild. Runs in the caller's
+    transaction; the caller commits.
+    """
+    product_ids = set(product_ids)
+    if not product_ids:
+        return 0
+    listed_by = db.session.query(ProductRelated.product_id).filter(
+        ProductRelated.related_id.in_(list(product_ids))).distinct()
+    affected = product_ids | {pid for (pid,) in listed_by}
+    now = datetime.utcnow()
+    for product_id in affected:
+        _rebuild_one(product_id, now)
+    db.session.flush()
+
+    now_listed = {rid for (rid,) in db.session.query(ProductRelated.related_id).filter(
+        ProductRelated.product_id.in_(list(product_ids)))}
+    for product_id in now_listed - affected:
+        _rebuild_one(product_id, now)
+    affected |= now_listed
+    db.session.flush()
+    return len(affected)
+
+
+def refresh_related_in_batches(product_ids, batch_size=500):
+    """refresh_related() for bulk jobs, committing every `batch_size` ids.
+
+    Core statements skip the ORM events that refresh neighbours on commit,
+    so jobs built on them call this once their own writes are in.
+    """
+    ids = sorted(set(product_ids))
+    refreshed = 0
+    for start in range(0, len(ids), batch_size):
+        refreshed += refresh_related(ids[start:start + batch_size])
+        db.session.commit()
+        db.session.expunge_all()
+    return refreshed
+
+
+def rebuild_all_related(batch_size=500):
+    """Recompute the whole table, committing every `batch_size` products."""
+    ProductRelated.query.delete(synchronize_session=False)
+    db.session.commit()
+    ids = [pid for (pid,) in db.session.query(Product.id).filter(Product.active == True).order_by(Product.id)]
+    now = datetime.utcnow()
+    for start in range(0, len(ids), batch_size):
+        for product_id in ids[start:start + batch_size]:
+            _rebuild_one(product_id, now)
+        db.session.commit()
+        db.session.expunge_all()
+    return len(ids)
+
+
+def get_related_products(product, limit=RELATED_LIMIT):
+    return (Product.query
+            .join(ProductRelated, ProductRelated.related_id == Product.id)
+            .filter(ProductRelated.product_id == product.id, Product.active == True)
+            .order_by(ProductRelated.rank)
+            .limit(limit)
+            .all())
+
+
+# --------------------------
+# Refresh on commit
+# --------------------------
+def _mark_dirty(session, product_id):
+    session.info.setdefault('related_dirty', set()).add(product_id)
+
+
+@event.listens_for(Product, 'after_insert')
+def _product_inserted(mapper, connection, target):
+    _mark_dirty(inspect(target).session, target.id)
+
+
+@event.listens_for(Product, 'after_update')
+def _product_updated(mapper, connection, target):
+    state = inspect(target)
+    if any(state.attrs[col].history.has_changes() for col in SCORED_COLUMNS):
+        _mark_dirty(state.session, target.id)
+
+
+@event.listens_for(Product, 'before_delete')
+def _product_deleted(mapper, connection, target):
+    session = inspect(target).session
+    table = ProductRelated.__table__
+    for (product_id,) in connection.execute(select(table.c.product_id).where(table.c.related_id == target.id)):
+        _mark_dirty(session, product_id)
+    connection.execute(table.delete().where(or_(table.c.product_id == target.id,
+                                                table.c.related_id == target.id)))
+
+
+@event.listens_for(db.session, 'before_commit')
+def _refresh_before_commit(session):
+    # Bulk jobs can switch this off and run `flask products rebuild-related`
+    if not current_app.config.get('RELATED_PRODUCTS_AUTO_REFRESH', True):
+        session.info.pop('related_dirty', None)
+        return
+    session.flush()
+    dirty = session.info.pop('related_dirty', None)
+    if dirty:
+        refresh_related(dirty)
+
+
+@event.listens_for(db.session, 'after_soft_rollback')
+def _discard_on_rollback(session, previous_transaction):
+    session.info.pop('related_dirty', None)
@@ -0,0 +1,271 @@
+"""
+Full-text search backed by SQLite FTS5.
+
+The product_fts virtual table mirrors Product.title / description /
+specifications keyed by rowid = product.id, and post_fts mirrors
+Post.title / body / tags keyed by rowid = post.id. ORM events keep both in
+sync on insert/update/delete, and `flask search rebuild-products` /
+`rebuild-posts` rebuild them from scratch. On databases other than SQLite
+we fall back to ILIKE filtering.
+"""
+import re
+
+import click
+from flask.cli import AppGroup
+from markupsafe import Markup, escape
+from sqlalchemy import bindparam, event, inspect, text, Float, Integer
+
+from db import db
+from models.post import Post
+from models.product import Product
+
+PRODUCT_FTS_TABLE = 'product_fts'
+PRODUCT_FTS_COLUMNS = ('title', 'description', 'specifications')
+# bm25() column weights: a title hit outranks a description hit, which
+# outranks a hit buried in the specifications.
+PRODUCT_FTS_WEIGHTS = (10.0, 3.0, 1.0)
+
+POST_FTS_TABLE = 'post_fts'
+POST_FTS_COLUMNS = ('title', 'body', 'tags')
+# A title hit outranks a tag hit, which outranks a hit in the body text
+POST_FTS_WEIGHTS = (10.0, 1.0, 4.0)
+# snippet() marks hits with these control characters; highlight() turns
+# them into <mark> after escaping the text around them.
+_HIT_START, _HIT_END = '\x02', '\x03'
+SNIPPET_TOKENS = 32
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def fts_supported(bind):
+    return bind.dialect.name == 'sqlite'
+
+
+def fts_query(q):
+    """Turn user input into a safe FTS5 MATCH expression.
+
+    Every word becomes a quoted prefix term, so "tomato see" matches
+    "Tomato Seeds" and FTS5 operators typed by users are never interpreted.
+    """
+    return ' '.join(f'"{token}"*' for token in _TOKEN_RE.findall(q or ''))
+
+
+# --------------------------
+# Index maintenance
+# --------------------------
+def create_product_index(conn):
+    if not fts_supported(conn):
+        return
+    conn.execute(text(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {PRODUCT_FTS_TABLE} "
+        f"USING fts5({', '.join(PRODUCT_FTS_COLUMNS)}, tokenize='unicode61 remove_diacritics 2')"
+    ))
+
+
+def index_products(conn, product_ids=None):
+    """(Re)index the given products, or every product when ids is None."""
+    if product_ids is None:
+        conn.execute(text(f"DELETE FROM {PRODUCT_FTS_TABLE}"))
+        where = ''
+        params = {}
+    else:
+        product_ids = list(product_ids)
+        if not product_ids:
+            return 0
+        unindex_products(conn, product_ids)
+        where = 'WHERE id IN :ids'
+        params = {'ids': product_ids}
+    stmt = text(
+        f"INSERT INTO {PRODUCT_FTS_TABLE}(rowid, title, description, specifications) "
+        f"SELECT id, title, coalesce(description, ''), coalesce(specifications, '') "
+        f"FROM product {where}"
+    )
+    if product_ids is not None:
+        stmt = stmt.bindparams(bindparam('ids', expanding=True))
+    return conn.execute(stmt, params).rowcount
+
+
+def unindex_products(conn, product_ids):
+    product_ids = list(product_ids)
+    if not product_ids:
+        return
+    stmt = text(f"DELETE FROM {PRODUCT_FTS_TABLE} WHERE rowid IN :ids").bindparams(
+        bindparam('ids', expanding=True))
+    conn.execute(stmt, {'ids': product_ids})
+
+
+def rebuild_product_index(conn):
+    conn.execute(text(f"DROP TABLE IF EXISTS {PRODUCT_FTS_TABLE}"))
+    create_product_index(conn)
+    return index_products(conn)
+
+
+def _write_product_row(conn, target):
+    conn.execute(text(f"DELETE FROM {PRODUCT_FTS_TABLE} WHERE rowid = :id"), {'id': target.id})
+    conn.execute(
+        text(f"INSERT INTO {PRODUCT_FTS_TABLE}(rowid, title, description, specifications) "
+             f"VALUES (:id, :title, :description, :specifications)"),
+        {
+            'id': target.id,
+            'title': target.title or '',
+            'description': target.description or '',
+            'specifications': target.specifications or '',
+        },
+    )
+
+
+@event.listens_for(Product, 'after_insert')
+def _index_new_product(mapper, connection, target):
+    if fts_supported(connection):
+        _write_product_row(connection, target)
+
+
+@event.listens_for(Product, 'after_update')
+def _reindex_product(mapper, connection, target):
+    if not fts_supported(connection):
+        return
+    state = inspect(target)
+    if any(state.attrs[col].history.has_changes() for col in PRODUCT_FTS_COLUMNS):
+        _write_product_row(connection, target)
+
+
+@event.listens_for(Product, 'after_delete')
+def _unindex_product(mapper, connection, target):
+    if fts_supported(connection):
+        unindex_products(connection, [target.id])
+
+
+# --------------------------
+# Querying
+# --------------------------
+def search_products(query, q):
+    """Restrict a Product query to rows matching `q`.
+
+    Returns (query, rank) where rank is the BM25 score column to order by
+    (lower is better), or None when the ILIKE fallback was used.
+    """
+    match = fts_query(q)
+    if not match or not fts_supported(db.engine):
+        like = f"%{q}%"
+        return query.filter((Product.title.ilike(like)) | (Product.description.ilike(like))), None
+
+    weights = ', '.join(str(w) for w in PRODUCT_FTS_WEIGHTS)
+    hits = text(
+        f"SELECT rowid AS product_id, bm25({PRODUCT_FTS_TABLE}, {weights}) AS rank "
+        f"FROM {PRODUCT_FTS_TABLE} WHERE {PRODUCT_FTS_TABLE} MATCH :match"
+    ).bindparams(match=match).columns(product_id=Integer, rank=Float).subquery('product_hits')
+    return query.join(hits, hits.c.product_id == Product.id), hits.c.rank
+
+
+# --------------------------
+# Blog posts
+# --------------------------
+def create_post_index(conn):
+    if not fts_supported(conn):
+        return
+    conn.execute(text(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {POST_FTS_TABLE} "
+        f"USING fts5({', '.join(POST_FTS_COLUMNS)}, tokenize='unicode61 remove_diacritics 2')"
+    ))
+
+
+def rebuild_post_index(conn):
+    conn.execute(text(f"DROP TABLE IF EXISTS {POST_FTS_TABLE}"))
+    create_post_index(conn)
+    return conn.execute(text(
+        f"INSERT INTO {POST_FTS_TABLE}(rowid, title, body, tags) "
+        f"SELECT id, title, coalesce(body, ''), coalesce(tags, '') FROM post"
+    )).rowcount
+
+
+def _write_post_row(conn, target):
+    conn.execute(text(f"DELETE FROM {POST_FTS_TABLE} WHERE rowid = :id"), {'id': target.id})
+    conn.execute(
+        text(f"INSERT INTO {POST_FTS_TABLE}(rowid, title, body, tags) VALUES (:id, :title, :body, :tags)"),
+        {'id': target.id, 'title': target.title or '', 'body': target.body or '', 'tags': target.tags or ''},
+    )
+
+
+@event.listens_for(Post, 'after_insert')
+def _index_new_post(mapper, connection, target):
+    if fts_supported(connection):
+        _write_post_row(connection, target)
+
+
+@event.listens_for(Post, 'after_update')
+def _reindex_post(mapper, connection, target):
+    if not fts_supported(connection):
+        return
+    state = inspect(target)
+    if any(state.attrs[col].history.has_changes() for col in POST_FTS_COLUMNS):
+        _write_post_row(connection, target)
+
+
+@event.listens_for(Post, 'after_delete')
+def _unindex_post(mapper, connection, target):
+    if fts_supported(connection):
+        connection.execute(text(f"DELETE FROM {POST_FTS_TABLE} WHERE rowid = :id"), {'id': target.id})
+
+
+def search_posts(query, q):
+    """Restrict a Post query to rows matching `q`; returns (query, rank) like search_products."""
+    match = fts_query(q)
+    if not match or not fts_supported(db.engine):
+        like = f"%{q}%"
+        return query.filter((Post.title.ilike(like)) | (Post.body.ilike(like)) | (Post.tags.ilike(like))), None
+
+    weights = ', '.join(str(w) for w in POST_FTS_WEIGHTS)
+    hits = text(
+        f"SELECT rowid AS post_id, bm25({POST_FTS_TABLE}, {weights}) AS rank "
+        f"FROM {POST_FTS_TABLE} WHERE {POST_FTS_TABLE} MATCH :match"
+    ).bindparams(match=match).columns(post_id=Integer, rank=Float).subquery('post_hits')
+    return query.join(hits, hits.c.post_id == Post.id), hits.c.rank
+
+
+def highlight(fragment):
+    """Escape a snippet() fragment and wrap its hits in <mark>."""
+    html = str(escape(fragment))
+    return Markup(html.replace(_HIT_START, '<mark>').replace(_HIT_END, '</mark>'))
+
+
+def post_snippets(q, post_ids):
+    """{post_id: Markup excerpt of the body with hits highlighted} for one page of results."""
+    match = fts_query(q)
+    post_ids = list(post_ids)
+    if not match or not post_ids or not fts_supported(db.engine):
+        return {}
+    stmt = text(
+        f"SELECT rowid, snippet({POST_FTS_TABLE}, 1, :start, :end, '…', {SNIPPET_TOKENS}) "
+        f"FROM {POST_FTS_TABLE} WHERE {POST_FTS_TABLE} MATCH :match AND rowid IN :ids"
+    ).bindparams(bindparam('ids', expanding=True))
+    rows = db.session.execute(stmt, {'match': match, 'ids': post_ids,
+                                     'start': _HIT_START, 'end': _HIT_END})
+    return {post_id: highlight(fragment) for post_id, fragment in rows}
+
+
+# --------------------------
+# CLI: flask search ...
+# --------------------------
+search_cli = AppGroup('search', help='Manage full-text search indexes.')
+
+
+@search_cli.command('rebuild-products')
+def rebuild_products_command():
+    """Drop and rebuild the product full-text index."""
+    if not fts_supported(db.engine):
+        click.echo('Full-text index is only available on SQLite; nothing to do.')
+        return
+    with db.engine.begin() as conn:
+        count = rebuild_product_index(conn)
+    click.echo(f'Indexed {count} products.')
+
+
+@search_cli.command('rebuild-posts')
+def rebuild_posts_command():
+    """Drop and rebuild the blog post full-text index."""
+    if not fts_supported(db.engine):
+        click.echo('Full-text index is only available on SQLite; nothing to do.')
+        return
+    with db.engine.begin() as conn:
+        count = rebuild_post_index(conn)
+    click.echo(f'Indexed {count} posts.')
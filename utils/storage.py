@@ -0,0 +1,200 @@
+"""
+Content-addressed upload storage.
+
+Every upload is streamed through SHA-256 while it is written to a temp file
+and then stored as static/uploads/store/<aa>/<sha256><ext>. A stored_file
+row tracks how many records reference that file, so re-uploading the same
+image costs disk once:
+
+    path = save_upload(request.files['image'], ext)   # refcount += 1
+    release_upload(old_path)                          # refcount -= 1
+
+Files whose refcount drops to zero are removed after the transaction
+commits, by delete_if_unused(): a short write transaction of its own that
+drops the row only while the refcount is still zero, so a concurrent
+upload of the same content keeps the file. Paths that predate the store
+(uuid names) have no row and are deleted outright on release, as before.
+
+Stored files never change, so add_cache_headers() marks them immutable.
+"""
+import hashlib
+import logging
+import os
+import tempfile
+from collections import Counter
+
+from flask import current_app, request
+from sqlalchemy import bindparam, event, select
+from sqlalchemy.dialects import postgresql, sqlite
+
+from db import db
+from models.stored_file import StoredFile
+from utils.images import delete_renditions
+
+STORE_PREFIX = 'uploads/store'
+CHUNK_SIZE = 64 * 1024
+# Content-addressed files can be cached forever
+STORE_MAX_AGE = 365 * 24 * 3600
+
+logger = logging.getLogger(__name__)
+
+
+def _absolute(path):
+    return os.path.join(current_app.static_folder, path)
+
+
+def save_upload(file, ext):
+    """Store a werkzeug FileStorage; returns its static-relative path.
+
+    `ext` is the already-validated, lower-cased extension (".jpg"). The
+    refcount bump is part of the current transaction; the caller commits.
+    """
+    folder = _absolute(STORE_PREFIX)
+    os.makedirs(folder, exist_ok=True)
+    digest = hashlib.sha256()
+    size = 0
+    fd, tmp = tempfile.mkstemp(dir=folder, suffix='.part')
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            while True:
+                chunk = file.stream.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                out.write(chunk)
+                size += len(chunk)
+        return _store(tmp, digest.hexdigest(), size, ext)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def store_local_file(tmp, ext):
+    """Move a finished temp file (e.g. an assembled chunked upload) into the
+    store; returns its static-relative path. The temp file is consumed."""
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with open(tmp, 'rb') as f:
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+                digest.update(chunk)
+                size += len(chunk)
+        return _store(tmp, digest.hexdigest(), size, ext)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def _store(tmp, sha, size, ext):
+    candidate = f"{STORE_PREFIX}/{sha[:2]}/{sha}{ext}"
+    dialect = postgresql if db.engine.dialect.name == 'postgresql' else sqlite
+    stmt = dialect.insert(StoredFile).values(sha256=sha, path=candidate, size=size, refcount=1)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[StoredFile.sha256],
+        set_={'refcount': StoredFile.refcount + 1},
+    ).returning(StoredFile.path)
+    path = db.session.execute(stmt).scalar_one()
+
+    target = _absolute(path)
+    if not os.path.exists(target):
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        os.replace(tmp, target)
+    else:
+        # A new reference to an old file: restart the grace period that
+        # `flask media reconcile` gives files whose row isn't committed yet
+        os.utime(target)
+    return path
+
+
+def release_upload(path):
+    """Drop one reference to `path`; the file goes once nothing uses it."""
+    if not path or path.startswith('http'):
+        return
+    stored = StoredFile.query.filter_by(path=path).first()
+    if stored is not None:
+        stored.refcount -= 1
+        if stored.refcount > 0:
+            return
+        # The row stays at zero until delete_if_unused() has removed the file
+    db.session.info.setdefault('released_files', set()).add(path)
+
+
+def release_uploads(paths):
+    """Bulk release_upload() for batch jobs: a few statements per call
+    instead of a query per path."""
+    counts = Counter(p for p in paths if p and not p.startswith('http'))
+    if not counts:
+        return
+    table = StoredFile.__table__
+    db.session.execute(
+        table.update()
+        .where(table.c.path == bindparam('b_path'))
+        .values(refcount=table.c.refcount - bindparam('b_count')),
+        [{'b_path': path, 'b_count': n} for path, n in counts.items()],
+    )
+    remaining = dict(db.session.execute(
+        select(table.c.path, table.c.refcount).where(table.c.path.in_(list(counts)))).all())
+    unused = [path for path in counts if remaining.get(path, 0) <= 0]
+    if unused:
+        db.session.info.setdefault('released_files', set()).update(unused)
+
+
+def delete_if_unused(path, older_than=None):
+    """Delete `path` and its stored_file row unless it is in use; returns
+    True if the file is gone.
+
+    The row is deleted first, which takes the write lock, and the file is
+    unlinked before that transaction commits. A concurrent save_upload() of
+    the same content therefore either bumped the refcount already, and the
+    file stays, or waits and then writes a fresh copy. Without `older_than`
+    (after a release) the row must still have refcount 0. Reconcile passes
+    the grace cutoff instead, having checked that nothing references the
+    path: the row goes whatever it says, but a file modified since the
+    cutoff (a new or re-referenced upload) is kept.
+    """
+    table = StoredFile.__table__
+    criteria = [table.c.path == path]
+    if older_than is None:
+        criteria.append(table.c.refcount <= 0)
+    full = _absolute(path)
+    with db.engine.connect() as conn:
+        with conn.begin() as transaction:
+            conn.execute(table.delete().where(*criteria))
+            if conn.execute(select(table.c.id).where(table.c.path == path)).first() is not None:
+                transaction.rollback()
+                return False
+            try:
+                if older_than is not None and os.stat(full).st_mtime >= older_than:
+                    transaction.rollback()
+                    return False
+                os.remove(full)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.warning('Could not delete %s: %s', path, e)
+                transaction.rollback()
+                return False
+    return True
+
+
+@event.listens_for(db.session, 'after_commit')
+def _delete_released(session):
+    for path in session.info.pop('released_files', ()):
+        if delete_if_unused(path):
+            delete_renditions(path)
+
+
+@event.listens_for(db.session, 'after_soft_rollback')
+def _keep_released(session, previous_transaction):
+    session.info.pop('released_files', None)
+
+
+def add_cache_headers(response):
+    """after_request hook: stored uploads are immutable, cache them for a year."""
+    if (request.endpoint == 'static' and response.status_code in (200, 304)
+            and (request.view_args or {}).get('filename', '').startswith(STORE_PREFIX + '/')):
+        response.cache_control.no_cache = None
+        response.cache_control.public = True
+        response.cache_control.max_age = STORE_MAX_AGE
+        response.cache_control.immutable = True
+    return response
@@ -0,0 +1,82 @@
+"""
+Cached product category tree.
+
+The whole Category/SubCategory tree is small, so it is built once per
+process and served from memory: as /shop/taxonomy.json (with a strong ETag
+so browsers revalidate with a 304) and as choices for the product forms.
+The admin category handlers call invalidate_taxonomy() after every change,
+which drops the cached copy in that process.
+
+The ETag is derived from the JSON bytes, so every process serving the
+same tree hands out the same tag. Other worker processes rebuild after
+TAXONOMY_TTL seconds at most.
+"""
+import hashlib
+import json
+import threading
+import time
+
+from sqlalchemy.orm import selectinload
+
+from models.category import Category
+
+TAXONOMY_TTL = 300
+
+_lock = threading.Lock()
+_state = {'tree': None, 'payload': None, 'etag': None, 'built_at': 0.0}
+
+
+def invalidate_taxonomy():
+    """Drop the cached tree; call after committing a category change."""
+    with _lock:
+        _state['tree'] = None
+
+
+def _build():
+    categories = (Category.query
+                  .options(selectinload(Category.subcategories))
+                  .order_by(Category.name)
+                  .all())
+    return [
+        {
+            'id': c.id,
+            'name': c.name,
+            'subcategories': [{'id': s.id, 'name': s.name}
+                              for s in sorted(c.subcategories, key=lambda s: s.name)],
+        }
+        for c in categories
+    ]
+
+
+def _load():
+    with _lock:
+        if _state['tree'] is None or time.monotonic() - _state['built_at'] > TAXONOMY_TTL:
+            tree = _build()
+            payload = json.dumps({'categories': tree}, separators=(',', ':')).encode()
+            _state['tree'] = tree
+            _state['payload'] = payload
+            _state['etag'] = 'tax-' + hashlib.sha256(payload).hexdigest()[:20]
+            _state['built_at'] = time.monotonic()
+        return _state['tree'], _state['payload'], _state['etag']
+
+
+def category_tree():
+    """[{'id', 'name', 'subcategories': [{'id', 'name'}]}], sorted by name."""
+    return _load()[0]
+
+
+def taxonomy_json():
+    """(JSON bytes, strong ETag) for /shop/taxonomy.json."""
+    _, payload, etag = _load()
+    return payload, etag
+
+
+def category_choices():
+    return [(c['id'], c['name']) for c in category_tree()]
+
+
+def subcategory_choices(category_id):
+    for c in category_tree():
+        if c['id'] == category_id:
+            return [(s['id'], s['name']) for s in c['subcategories']]
+    return []
@@ -0,0 +1,203 @@
+"""
+Resumable chunked uploads for large blog media.
+
+    POST   /blog/uploads                 {filename, size}  -> {id, offset: 0, chunk_size}
+    PATCH  /blog/uploads/<id>            raw bytes, Upload-Offset + X-Chunk-SHA256 (required)
+    GET    /blog/uploads/<id>            -> {offset, size}   (where to resume)
+    POST   /blog/uploads/<id>/complete   {post_id}           -> BlogMedia
+
+Each chunk is streamed to its own temp file while it is hashed, checked
+against the client's SHA-256, and only then appended to the session's
+.part file at its offset. Parts are staged in UPLOAD_INCOMING_FOLDER
+(instance/uploads by default), outside static/, so a half-written file is
+never served. The session's `received` column moves with a
+conditional UPDATE, so a retried or duplicated chunk can never be appended
+twice. Memory use is one read buffer however large the file.
+
+A complete upload goes into the content-addressed store (utils.storage).
+Abandoned sessions are removed by `flask media reconcile --delete`
+after the grace period, together with their .part files and any stray
+chunk files left by a crashed request.
+"""
+import hashlib
+import os
+import time
+import uuid
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import update
+from sqlalchemy.orm.attributes import set_committed_value
+
+from db import db
+from models.upload_session import UploadSession
+from utils.storage import CHUNK_SIZE, store_local_file
+
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+DEFAULT_CHUNK_BYTES = 4 * 1024 * 1024
+
+
+class UploadError(Exception):
+    """Rejected upload request; `status` is the HTTP status to answer with."""
+
+    def __init__(self, message, status=400, offset=None):
+        super().__init__(message)
+        self.status = status
+        self.offset = offset
+
+
+def max_upload_bytes():
+    return current_app.config.get('UPLOAD_MAX_BYTES', DEFAULT_MAX_BYTES)
+
+
+def chunk_bytes():
+    return current_app.config.get('UPLOAD_CHUNK_BYTES', DEFAULT_CHUNK_BYTES)
+
+
+def incoming_folder():
+    return current_app.config.get('UPLOAD_INCOMING_FOLDER') or os.path.join(current_app.instance_path, 'uploads')
+
+
+def _incoming(name):
+    return os.path.join(incoming_folder(), name)
+
+
+def part_path(upload_id):
+    return _incoming(f'{upload_id}.part')
+
+
+def get_upload(upload_id, user_id):
+    """The caller's upload session, or None."""
+    upload = db.session.get(UploadSession, upload_id)
+    if upload is None or upload.user_id != user_id:
+        return None
+    return upload
+
+
+def start_upload(user_id, filename, ext, size):
+    """Open a session for a `size`-byte file; the caller commits."""
+    if not isinstance(size, int) or size <= 0:
+        raise UploadError('size must be a positive number of bytes')
+    if size > max_upload_bytes():
+        raise UploadError(f'file is larger than the {max_upload_bytes() // (1024 * 1024)} MB limit', 413)
+    upload = UploadSession(id=uuid.uuid4().hex, user_id=user_id, filename=filename[:255], ext=ext,
+                           size=size, received=0)
+    os.makedirs(_incoming(''), exist_ok=True)
+    open(part_path(upload.id), 'wb').close()
+    db.session.add(upload)
+    return upload
+
+
+def _receive(stream, length, target, checksum):
+    """Copy exactly `length` bytes from `stream` into `target`, verifying the SHA-256."""
+    digest = hashlib.sha256()
+    remaining = length
+    with open(target, 'wb') as out:
+        while remaining:
+            block = stream.read(min(CHUNK_SIZE, remaining))
+            if not block:
+                raise UploadError('chunk ended early; resend it from the same offset')
+            digest.update(block)
+            out.write(block)
+            remaining -= len(block)
+    if digest.hexdigest() != checksum.strip().lower():
+        raise UploadError('chunk checksum mismatch; resend it from the same offset', 422)
+
+
+def append_chunk(upload, offset, stream, length, checksum):
+    """Append one chunk at `offset`; returns the new offset. The caller commits.
+
+    `checksum` is the hex SHA-256 of the chunk, which the client must send.
+    """
+    if offset != upload.received:
+        raise UploadError('offset does not match the bytes received', 409, offset=upload.received)
+    if length is None:
+        raise UploadError('Content-Length is required', 411)
+    if not checksum:
+        raise UploadError('X-Chunk-SHA256 is required')
+    if length <= 0 or length > chunk_bytes():
+        raise UploadError(f'chunks must be 1..{chunk_bytes()} bytes', 413)
+    if offset + length > upload.size:
+        raise UploadError('chunk runs past the declared file size')
+
+    chunk = _incoming(f'{upload.id}.{offset}.{os.getpid()}.part')
+    try:
+        _receive(stream, length, chunk, checksum)
+        new_offset = offset + length
+        # Claim the range first: a concurrent duplicate of this chunk loses here
+        claimed = db.session.execute(
+            update(UploadSession)
+            .where(UploadSession.id == upload.id, UploadSession.received == offset)
+            .values(received=new_offset, updated_at=datetime.utcnow())
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        if not claimed:
+            raise UploadError('offset does not match the bytes received', 409)
+        with open(part_path(upload.id), 'r+b') as out, open(chunk, 'rb') as src:
+            out.seek(offset)
+            for block in iter(lambda: src.read(CHUNK_SIZE), b''):
+                out.write(block)
+            # Drop bytes left over from an append whose commit failed
+            out.truncate(new_offset)
+    finally:
+        if os.path.exists(chunk):
+            os.remove(chunk)
+    set_committed_value(upload, 'received', new_offset)
+    return new_offset
+
+
+def finish_upload(upload):
+    """Store a complete upload and drop its session; returns the stored path.
+
+    The caller adds the row that references the path and commits.
+    """
+    if upload.received != upload.size:
+        raise UploadError('upload is not complete', 409, offset=upload.received)
+    path = store_local_file(part_path(upload.id), upload.ext)
+    db.session.delete(upload)
+    return path
+
+
+def cancel_upload(upload):
+    db.session.delete(upload)
+    try:
+        os.remove(part_path(upload.id))
+    except FileNotFoundError:
+        pass
+
+
+def stale_uploads(cutoff):
+    """Query for sessions with no activity since `cutoff`."""
+    return UploadSession.query.filter(UploadSession.updated_at < cutoff)
+
+
+def drop_stale_uploads(grace):
+    """Drop sessions idle for longer than `grace` and their staged files;
+    returns the number of sessions dropped.
+
+    Commits the deletes, then removes every staged file that no remaining
+    session owns and that is either a dropped session's part or older than
+    the grace period, which also catches chunk files left by a crashed
+    request.
+    """
+    stale = stale_uploads(datetime.utcnow() - grace)
+    dropped = {upload_id for (upload_id,) in stale.with_entities(UploadSession.id)}
+    if dropped:
+        UploadSession.query.filter(UploadSession.id.in_(dropped)).delete(synchronize_session=False)
+        db.session.commit()
+    live = {upload_id for (upload_id,) in db.session.query(UploadSession.id)}
+    cutoff = time.time() - grace.total_seconds()
+    try:
+        entries = list(os.scandir(incoming_folder()))
+    except FileNotFoundError:
+        return len(dropped)
+    for entry in entries:
+        upload_id = entry.name.split('.', 1)[0]
+        if not entry.name.endswith('.part') or upload_id in live:
+            continue
+        try:
+            if upload_id in dropped or entry.stat().st_mtime < cutoff:
+                os.remove(entry.path)
+        except FileNotFoundError:
+            pass
+    return len(dropped)